@@ -0,0 +1,63 @@
+# Measures how long importing fct and the toolbox takes, in a fresh interpreter each time,
+# and fails if any of them loads libclang or the worker pools, which only `execute_tools` needs.
+# Usage, from the repository root:
+#   python benchmarks/bench_import.py [repetitions]
+
+import os
+import sys
+import subprocess
+
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+IMPORTS = {
+    "python": "pass",
+    "fct": "import fct",
+    "fct_toolbox": "import fct_toolbox",
+    "all tools": "from fct_toolbox import enum_info, layout, soa, serialize, struct_hash, struct_repr",
+}
+
+DEFERRED_MODULES = ["clang", "clang.cindex", "multiprocessing", "concurrent.futures"]
+"""
+modules that must not be loaded by the imports above
+"""
+
+
+def bench_import(statement: str, repetitions: int) -> tuple[float, list[str]]:
+    code = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {os.path.abspath(ROOT_DIR)!r})\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(elapsed, *[m for m in {DEFERRED_MODULES!r} if m in sys.modules])\n"
+    )
+
+    best = float("inf")
+    loaded = []
+    for _ in range(repetitions):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+        best = min(best, float(out[0]))
+        loaded = out[1:]
+
+    return best, loaded
+
+
+def main() -> None:
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    failed = False
+
+    print(f"{'import':<16}{'time (ms)':>12}  eagerly loaded")
+
+    for name, statement in IMPORTS.items():
+        t, loaded = bench_import(statement, repetitions)
+        failed |= len(loaded) > 0
+        print(f"{name:<16}{t * 1000:>12.1f}  {', '.join(loaded) or '-'}")
+
+    if failed:
+        print("some of the deferred modules are loaded at import time")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Compares the libclang parse profiles of fct.core on the entry source of each example project.
+# Usage, from the repository root:
+#   python benchmarks/bench_parse.py [repetitions]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fct
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+def bench_example(example_dir: str, profile: str, repetitions: int) -> float:
+    cwd = os.getcwd()
+    os.chdir(example_dir)
+
+    try:
+        index = fct.clang.cindex.Index.create()
+        options = fct.parse_options_of(profile)
+        best = float("inf")
+
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            index.parse(fct.bopt.source, fct.libclang_flags(), options=options)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+
+    return best
+
+
+def main() -> None:
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    profiles = list(fct.PARSE_PROFILES)
+    examples = sorted(
+        e for e in os.listdir(EXAMPLES_DIR)
+        if os.path.isfile(os.path.join(EXAMPLES_DIR, e, fct.bopt.source))
+    )
+
+    print(f"{'example':<16}" + "".join(f"{p + ' (ms)':>18}" for p in profiles) + f"{'speedup':>10}")
+
+    for e in examples:
+        times = [bench_example(os.path.join(EXAMPLES_DIR, e), p, repetitions) for p in profiles]
+        speedup = times[0] / times[-1]
+        print(f"{e:<16}" + "".join(f"{t * 1000:>18.1f}" for t in times) + f"{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Measures how each phase of `fct build` scales with the size of synthetic projects (see synth.py).
+# Usage, from the repository root:
+#   python benchmarks/bench_scaling.py [--out results.json] [--baseline baseline.json] [--tolerance 0.2]
+#
+# Each phase is measured on each project size, the results are saved as json,
+# and compared against a baseline if provided: the exit code is 1 if a phase regressed over the tolerance.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fct
+
+from fct_toolbox import enum_info, soa, struct_repr
+from synth import SynthConfig, generate_project
+
+
+TOOLS = [soa, struct_repr, enum_info]
+
+SIZES = [
+    SynthConfig(structs=10, enums=10),
+    SynthConfig(structs=100, enums=100, namespaces=10),
+    SynthConfig(structs=1000, enums=1000, namespaces=50, system_includes=12),
+]
+
+TAGS = ["soa", "struct_repr", "enum_info"]
+KINDS = ["struct_decl", "enum_decl"]
+
+
+def timed(f):
+    start = time.perf_counter()
+    r = f()
+    return r, (time.perf_counter() - start) * 1000
+
+
+def bench_project(cfg: SynthConfig, compile: bool) -> dict[str, float]:
+    results = {}
+
+    with tempfile.TemporaryDirectory() as prj:
+        cwd = os.getcwd()
+        os.chdir(prj)
+
+        try:
+            generate_project(".", cfg)
+
+            # as `fct prepare` would, so that the parse doesn't stop at the missing generated headers
+            for tool in TOOLS:
+                fct.write_if_changed(os.path.join("g", f"{tool.cpp.name}.g.h"), fct.PREPARED_HEADER + "\n")
+
+            index = fct.clang.cindex.Index.create()
+            options = fct.parse_options_of(fct.bopt.parse_profile)
+            tu, results["parse"] = timed(lambda: index.parse(fct.bopt.source, fct.libclang_flags(), options=options))
+
+            for d in tu.diagnostics:
+                if d.severity >= d.Fatal:
+                    print(f"WARNING {cfg.name}: {d}, the results are not meaningful")
+
+            _, results["collect_tagged_decls"] = timed(
+                lambda: fct.analysis.collect_tagged_decls(tu.cursor, TAGS, KINDS, fct.bopt.project_dirs)
+            )
+            _, results["build_tag_index"] = timed(lambda: fct.analysis.build_tag_index(tu, fct.bopt.project_dirs))
+
+            builders = []
+            for tool in TOOLS:
+                gs, results[f"{tool.__name__}.execute"] = timed(lambda: tool.execute(tu))
+                builders.extend(gs)
+
+            def emit_headers(builders):
+                for g in builders:
+                    fct.emit_header(g)
+
+            _, results["emit headers"] = timed(lambda: emit_headers(builders))
+
+            # a builder can be emitted only once, the tools generate them again
+            builders = [g for tool in TOOLS for g in tool.execute(tu)]
+            _, results["emit headers (unchanged)"] = timed(lambda: emit_headers(builders))
+
+            if compile:
+                r, results["compile"] = timed(
+                    lambda: fct.cmd(f"{fct.bopt.cc} -c {fct.bopt.source} -o o/main.o {' '.join(fct.bopt.flags)}")
+                )
+                if r != 0:
+                    results["compile"] = float("nan")
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+
+    for size, phases in results.items():
+        for phase, ms in phases.items():
+            base = baseline.get(size, {}).get(phase)
+            if base is None or base <= 0 or ms != ms:
+                continue
+
+            ratio = ms / base
+            if ratio > 1 + tolerance:
+                ok = False
+                print(f"REGRESSION {size} {phase}: {base:.1f}ms -> {ms:.1f}ms ({ratio:.2f}x)")
+
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench_scaling.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--no-compile", action="store_true")
+    parser.add_argument("--max-structs", type=int, default=None, help="skips the sizes larger than this")
+    a = parser.parse_args()
+
+    results = {}
+    for cfg in SIZES:
+        if a.max_structs is not None and cfg.structs > a.max_structs:
+            continue
+
+        results[cfg.name] = bench_project(cfg, compile=not a.no_compile)
+
+        print(cfg.name)
+        for phase, ms in results[cfg.name].items():
+            print(f"    {phase:<36}{ms:>12.1f} ms")
+
+    with open(a.out, "w") as f:
+        json.dump(results, f, indent=4)
+
+    print(f"Results: {a.out}")
+
+    if a.baseline is not None:
+        with open(a.baseline) as f:
+            baseline = json.load(f)
+
+        if not compare(results, baseline, a.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
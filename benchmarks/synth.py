@@ -0,0 +1,105 @@
+# Generates synthetic fct projects, with a configurable amount of tagged types,
+# for the benchmarks to measure how each phase scales.
+
+import os
+
+from dataclasses import dataclass
+
+
+SYSTEM_INCLUDES = [
+    "<stdint.h>",
+    "<iostream>",
+    "<string>",
+    "<sstream>",
+    "<vector>",
+    "<map>",
+    "<unordered_map>",
+    "<memory>",
+    "<algorithm>",
+    "<functional>",
+    "<array>",
+    "<optional>",
+]
+
+FIELD_TYPES = ["int", "float", "double", "uint8_t", "bool", "char const*", "int64_t"]
+
+
+@dataclass
+class SynthConfig:
+    structs: int = 10
+    enums: int = 10
+    fields: int = 4
+    enum_members: int = 8
+    namespaces: int = 2
+    system_includes: int = 4
+
+    @property
+    def name(self) -> str:
+        return (
+            f"s{self.structs}_e{self.enums}_f{self.fields}"
+            f"_m{self.enum_members}_n{self.namespaces}_i{self.system_includes}"
+        )
+
+
+def gen_main(cfg: SynthConfig) -> str:
+    """
+    structs are tagged for `soa` and `struct_repr`, enums for `enum_info`,
+    and they are spread evenly among the namespaces.
+    """
+
+    lines = [f"#include {i}" for i in SYSTEM_INCLUDES[:max(1, cfg.system_includes)]]
+    lines += [
+        "#include <stdint.h>",
+        "",
+        "#define FCT_NOTE(s) [[clang::annotate(s)]]",
+        "",
+    ]
+
+    namespaces = max(1, cfg.namespaces)
+    for n in range(namespaces):
+        lines.append(f"namespace synth_ns{n}")
+        lines.append("{")
+
+        for s in range(n, cfg.structs, namespaces):
+            lines.append(f'    struct FCT_NOTE("soa") FCT_NOTE("struct_repr") Struct{s}')
+            lines.append("    {")
+            for f in range(cfg.fields):
+                lines.append(f"        {FIELD_TYPES[(s + f) % len(FIELD_TYPES)]} field{f};")
+            lines.append("    };")
+            lines.append("")
+
+        for e in range(n, cfg.enums, namespaces):
+            members = ", ".join(f"member{m}" for m in range(cfg.enum_members))
+            lines.append(f'    enum struct FCT_NOTE("enum_info") Enum{e} {{ {members} }};')
+
+        lines.append("}")
+        lines.append("")
+
+    lines += [
+        '#include "g/soa.g.h"',
+        '#include "g/repr.g.h"',
+        '#include "g/enum_info.g.h"',
+        "",
+        "int main()",
+        "{",
+        "    return 0;",
+        "}",
+        "",
+    ]
+
+    return "\n".join(lines)
+
+
+def generate_project(path: str, cfg: SynthConfig) -> str:
+    """
+    writes the project to `path`, returns the path of its entry source.
+    """
+
+    os.makedirs(os.path.join(path, "g"), exist_ok=True)
+    os.makedirs(os.path.join(path, "o"), exist_ok=True)
+
+    main_path = os.path.join(path, "main.cpp")
+    with open(main_path, "w") as f:
+        f.write(gen_main(cfg))
+
+    return main_path
@@ -0,0 +1,9 @@
+import fct
+
+from fct_toolbox import enum_info, struct_repr
+
+# every source is analyzed, but the generated headers are written for the entry one (main.cpp):
+# `app::Extra` is only included by src/other.cpp, so it is skipped
+fct.bopt.sources = ["main.cpp", "src/*.cpp"]
+fct.install_tools(periodics=[enum_info, struct_repr], manuals=[])
+fct.run_argv()
@@ -0,0 +1,15 @@
+#pragma once
+
+#include "notes.h"
+
+namespace app
+{
+    // main.cpp doesn't include this header, so no code is generated for it
+    enum class ENUM_INFO Extra
+    {
+        first,
+        second,
+    };
+
+    inline int extra_count() { return 2; }
+}
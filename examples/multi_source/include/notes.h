@@ -0,0 +1,5 @@
+#pragma once
+
+#define FCT_NOTE(s) [[clang::annotate(s)]]
+#define ENUM_INFO FCT_NOTE("enum_info")
+#define REPR FCT_NOTE("struct_repr")
@@ -0,0 +1,18 @@
+#pragma once
+
+#include "notes.h"
+
+namespace app
+{
+    enum class ENUM_INFO ShapeKind
+    {
+        circle,
+        square,
+    };
+
+    struct REPR Shape
+    {
+        ShapeKind kind;
+        float size;
+    };
+}
@@ -0,0 +1,16 @@
+#include <iostream>
+#include <string>
+
+#include "include/shape.h"
+#include "g/enum_info.g.h"
+#include "g/repr.g.h"
+
+std::string describe(app::Shape const& s);
+
+int main()
+{
+    app::Shape s = { app::ShapeKind::square, 2.5f };
+
+    std::cout << g::repr(s) << std::endl;
+    std::cout << describe(s) << std::endl;
+}
@@ -0,0 +1,11 @@
+#include <string>
+
+#include "../include/shape.h"
+#include "../include/extra.h"
+#include "../g/enum_info.g.h"
+#include "../g/repr.g.h"
+
+std::string describe(app::Shape const& s)
+{
+    return std::string(g::EnumInfo<app::ShapeKind>::repr(s.kind)) + " of " + std::to_string(app::extra_count()) + " extra kinds";
+}
@@ -0,0 +1,5 @@
+import fct
+
+from fct_toolbox import serialize
+fct.install_tools(periodics=[serialize], manuals=[])
+fct.run_argv()
@@ -0,0 +1,61 @@
+#include <stdint.h>
+#include <string>
+#include <vector>
+#include <iostream>
+
+#define FCT_NOTE(s) [[clang::annotate(s)]]
+#define SERIALIZE FCT_NOTE("serialize")
+
+enum struct Kind : uint8_t { Star, Planet, Moon };
+
+struct SERIALIZE Body
+{
+    double x;
+    double y;
+    double mass;
+    uint32_t id;
+    Kind kind;
+    uint8_t flags[3];
+};
+
+struct SERIALIZE Catalog
+{
+    std::string name;
+    uint32_t revision;
+    Body origin;
+};
+
+#include "g/serialize.g.h"
+
+int main()
+{
+    // fixed layout, copied in bulk
+    std::vector<Body> bodies;
+    for (uint32_t i = 0; i < 1000000; i++)
+        bodies.push_back(Body { .x = i * 0.5, .y = 1, .mass = 3, .id = i, .kind = Kind::Moon, .flags = { 1, 2, 3 } });
+
+    std::string buffer;
+    g::serialize(buffer, bodies.data(), bodies.size());
+    std::cout << "bodies bytes: " << buffer.size() << std::endl;
+
+    std::vector<Body> read_bodies;
+    std::string_view in = buffer;
+    bool ok = g::deserialize(in, read_bodies);
+    std::cout << "bodies read: " << ok << ", " << read_bodies.size() << ", last id: " << read_bodies.back().id << std::endl;
+
+    // variable size, field by field
+    auto catalog = Catalog { .name = "solar system", .revision = 7, .origin = bodies[42] };
+    buffer.clear();
+    g::serialize(buffer, &catalog, 1);
+
+    std::vector<Catalog> read_catalogs;
+    in = buffer;
+    ok = g::deserialize(in, read_catalogs);
+    std::cout << "catalog read: " << ok << ", " << read_catalogs[0].name << ", origin id: " << read_catalogs[0].origin.id << std::endl;
+
+    // layout or version mismatches are rejected
+    in = buffer;
+    std::cout << "catalog read as bodies: " << g::deserialize(in, read_bodies) << std::endl;
+
+    return 0;
+}
@@ -5,12 +5,23 @@
 #define SOA FCT_NOTE("soa")
 #define REPR FCT_NOTE("struct_repr_inline")
 
+#define SOA_COLD FCT_NOTE("soa_cold")
+
 struct SOA REPR Person
 {
     char const* name;
     uint8_t age;
 };
 
+struct SOA Particle
+{
+    float x;
+    float y;
+    float vx;
+    float vy;
+    SOA_COLD uint32_t spawn_tick;
+};
+
 #include "g/soa.g.h"
 #include "g/repr.g.h"
 
@@ -38,5 +49,21 @@ int main()
 
     DUMP(g::repr(aos_people[10]));
 
+    // growable soa, with aligned columns
+
+    auto particles = g::SoaVec<Particle>();
+    for (uint32_t i = 0; i < 1000; i++)
+        particles.push_back(Particle { .x = float(i), .y = 0, .vx = 1, .vy = 2, .spawn_tick = i });
+
+    // contiguous columns, the loop can be vectorized
+    auto x = particles.column_x();
+    auto vx = particles.column_vx();
+    for (size_t i = 0; i < particles.size(); i++)
+        x[i] += vx[i];
+
+    DUMP(particles.size());
+    DUMP(particles.get_x(999));
+    DUMP(particles.get_spawn_tick(999));
+
     return 0;
 }
\ No newline at end of file
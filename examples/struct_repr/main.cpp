@@ -57,5 +57,10 @@ int main()
     };
 
     std::cout << g::repr(p) << std::endl;
+
+    // appends to an existing buffer, no intermediate strings
+    std::string buf = "pos: ";
+    g::repr_into(buf, p.sp.pos);
+    std::cout << buf << std::endl;
     return 0;
 }
\ No newline at end of file
@@ -1,2 +1,8 @@
 from .core import *
-from .analysis import *
\ No newline at end of file
+from .analysis import *
+from . import core as _core
+
+
+def __getattr__(name):
+    # `fct.clang` loads libclang on first access, see `core.load_libclang`
+    return _core.__getattr__(name)
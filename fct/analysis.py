@@ -1,11 +1,16 @@
 # This module is part of fct.py, it will be accessible from there,
 # this servs as an helper module to interact with clang syntax tree
 
-from clang.cindex import CursorKind
+import os
+import weakref
+
 from typing import Any
 
 
+# libclang is loaded lazily by `fct.core.load_libclang`, its types can't be named at import time
 ClangNode = Any
+ClangType = Any
+ClangTranslationUnit = Any
 
 
 STATIC_CONTAINERS_KINDS = [
@@ -18,7 +23,12 @@ STATIC_CONTAINERS_KINDS = [
 ]
 
 
-def collect_tagged_decls(root: ClangNode, tags: list[str], accepted_node_kinds: list[str]) -> list[ClangNode]:
+def collect_tagged_decls(
+    root: ClangNode,
+    tags: list[str],
+    accepted_node_kinds: list[str],
+    project_dirs: list[str] | None = None
+) -> list[ClangNode]:
     """
     Recursively collects all nodes that are decls and tagged with at least one of the provided tags.
 
@@ -27,6 +37,10 @@ def collect_tagged_decls(root: ClangNode, tags: list[str], accepted_node_kinds:
     
     accepted_node_kinds
         must be all decl kinds
+
+    project_dirs
+        when provided, decls located in system headers or outside of these directories are not traversed,
+        ignored when the tags of the translation unit are indexed, the index has its own
     """
 
     assert len(tags) > 0
@@ -34,11 +48,22 @@ def collect_tagged_decls(root: ClangNode, tags: list[str], accepted_node_kinds:
     for k in accepted_node_kinds:
         if not k.endswith('_decl'):
             raise ValueError(f"Node kind {repr(k)} is not a decl node kind, therefore it doesn't support tagging")
+
+    if kindof(root) == "translation_unit":
+        index = get_tag_index(root.translation_unit)
+        if index is not None:
+            return index.query(tags, accepted_node_kinds)
     
-    return _collect_tagged_nodes(root, tags, accepted_node_kinds)
+    scope = None if project_dirs is None else ProjectScope(project_dirs)
+    return _collect_tagged_nodes(root, tags, accepted_node_kinds, scope)
 
 
-def _collect_tagged_nodes(node: ClangNode, tags: list[str], kinds: list[str]) -> list[ClangNode]:
+def _collect_tagged_nodes(
+    node: ClangNode,
+    tags: list[str],
+    kinds: list[str],
+    scope: "ProjectScope | None" = None
+) -> list[ClangNode]:
     k = kindof(node)
     is_static_container = k in STATIC_CONTAINERS_KINDS
 
@@ -52,8 +77,8 @@ def _collect_tagged_nodes(node: ClangNode, tags: list[str], kinds: list[str]) ->
         if not is_tagged_right and kindof(c) == "annotate_attr":
             is_tagged_right = c.displayname.lower() in tags
 
-        if is_static_container:
-            collected.extend(_collect_tagged_nodes(c, tags, kinds))
+        if is_static_container and (scope is None or scope.contains(c)):
+            collected.extend(_collect_tagged_nodes(c, tags, kinds, scope))
     
     if k in kinds and is_tagged_right:
         collected.append(node)
@@ -61,6 +86,197 @@ def _collect_tagged_nodes(node: ClangNode, tags: list[str], kinds: list[str]) ->
     return collected
 
 
+class ProjectScope:
+    """
+    Tells whether a node is part of the user code, that is, located in one of the project directories
+    and not in a system header. Nodes outside of it can't carry tags worth collecting,
+    so the traversals prune them together with their whole subtree (all of `std::` for example).
+    With `project_dirs` None every file is part of it, system headers excepted.
+    """
+
+    def __init__(self, project_dirs: list[str] | None) -> None:
+        self.dirs: list[str] | None = None if project_dirs is None else [os.path.join(os.path.abspath(d), "") for d in project_dirs]
+        self.files: dict[str, bool] = {}
+
+    def contains(self, node: ClangNode) -> bool:
+        loc = node.location
+        if loc.file is None or loc.is_in_system_header:
+            return False
+
+        if self.dirs is None:
+            return True
+
+        name = loc.file.name
+        if name not in self.files:
+            path = os.path.abspath(name)
+            self.files[name] = any(path.startswith(d) for d in self.dirs)
+
+        return self.files[name]
+
+
+class TagIndex:
+    """
+    Tags of all the decls reachable from a root node, collected with a single traversal,
+    so that any number of tools can query them without walking the syntax tree again.
+    The traversal is the same of `collect_tagged_decls`.
+    Tagged decls are unique by USR, the same type seen from more roots (or declared more times) is indexed once,
+    by its definition when there is one. Decls with different USRs but the same fully qualified name
+    (the same type in anonymous namespaces of different translation units) are indexed once as well,
+    the generated code couldn't tell them apart anyway.
+    """
+
+    def __init__(self, root: ClangNode, project_dirs: list[str] | None = None) -> None:
+        # tagged decls, in the order `_collect_tagged_nodes` would find them
+        self.tagged: list[ClangNode] = []
+        self.by_tag: dict[str, list[int]] = {}
+        self.tags_of: dict[ClangNode, list[str]] = {}
+        # usr -> index in `tagged`
+        self.usrs: dict[str, int] = {}
+        # fully qualified name -> index in `tagged`
+        self.fqns: dict[str, int] = {}
+        self.scope: ProjectScope | None = None if project_dirs is None else ProjectScope(project_dirs)
+        # when set, only decls defined in these files are indexed, see `add_root`
+        self.visible_files: set[str] | None = None
+        # fully qualified name -> tagged decl left out by `add_root`
+        self.skipped: dict[str, ClangNode] = {}
+
+        self._index_node(root)
+
+    def add_root(self, root: ClangNode, visible_files: set[str] | None = None) -> None:
+        """
+        indexes the decls reachable from one more root, the cursor of another translation unit for example.
+        with `visible_files` (see `files_of`) the decls defined in other files are skipped and recorded in `skipped`,
+        the tags of their redeclarations of decls defined in those files are still merged
+        """
+
+        self.visible_files = visible_files
+        try:
+            self._index_node(root)
+        finally:
+            self.visible_files = None
+
+    def _index_node(self, node: ClangNode) -> None:
+        k = kindof(node)
+        is_static_container = k in STATIC_CONTAINERS_KINDS
+        tags = []
+
+        for c in node.get_children():
+            ck = kindof(c)
+
+            if ck == "annotate_attr":
+                tags.append(c.displayname.lower())
+            elif is_static_container and (ck.endswith("_decl") or ck in STATIC_CONTAINERS_KINDS):
+                if self.scope is None or self.scope.contains(c):
+                    self._index_node(c)
+
+        if not k.endswith("_decl"):
+            return
+
+        self.tags_of[node] = tags
+        if len(tags) == 0:
+            return
+
+        if self.visible_files is not None and _file_key(origin_of(node.get_definition() or node)) not in self.visible_files:
+            self.skipped.setdefault(get_fully_qualified_name(node), node.get_definition() or node)
+            return
+
+        usr = node.get_usr()
+        fqn = get_fully_qualified_name(node)
+        i = self.usrs.get(usr, self.fqns.get(fqn))
+        if i is not None:
+            # already seen, the tags of all its decls are merged
+            if usr != "":
+                self.usrs.setdefault(usr, i)
+
+            merged = self.tags_of[self.tagged[i]]
+            if node.is_definition() and not self.tagged[i].is_definition():
+                self.tagged[i] = node
+
+            for t in tags:
+                if t not in merged:
+                    merged.append(t)
+                    self.by_tag.setdefault(t, []).append(i)
+
+            self.tags_of[node] = merged
+            return
+
+        i = len(self.tagged)
+        self.tagged.append(node)
+        if usr != "":
+            self.usrs[usr] = i
+
+        self.fqns[fqn] = i
+
+        for t in set(tags):
+            self.by_tag.setdefault(t, []).append(i)
+
+    def query(self, tags: list[str], kinds: list[str]) -> list[ClangNode]:
+        found = set()
+        for t in tags:
+            found.update(self.by_tag.get(t, []))
+
+        return [self.tagged[i] for i in sorted(found) if kindof(self.tagged[i]) in kinds]
+
+
+_tag_indexes: "weakref.WeakKeyDictionary[Any, TagIndex]" = weakref.WeakKeyDictionary()
+
+
+def build_tag_index(tu: Any, project_dirs: list[str] | None = None) -> TagIndex:
+    """
+    indexes the tags of translation unit `tu`, from now on `collect_tagged_decls`
+    and `collect_tags` answer from the index instead of traversing its syntax tree.
+    call it again if the translation unit is reparsed.
+    see `ProjectScope` for `project_dirs`.
+    """
+
+    index = TagIndex(tu.cursor, project_dirs)
+    set_tag_index(tu, index)
+    return index
+
+
+def build_merged_tag_index(tus: list[Any], project_dirs: list[str] | None = None) -> TagIndex:
+    """
+    indexes the tags of all the translation units `tus` in a single index, merged by USR,
+    and uses it for each of them: `collect_tagged_decls` on any of them finds the tagged decls of all.
+    the generated headers are written for the first one, so from the others only the decls defined
+    in its files are merged, the rest is recorded in `TagIndex.skipped`
+    """
+
+    index = TagIndex(tus[0].cursor, project_dirs)
+    visible_files = files_of(tus[0])
+    for tu in tus[1:]:
+        index.add_root(tu.cursor, visible_files)
+
+    for tu in tus:
+        set_tag_index(tu, index)
+
+    return index
+
+
+def files_of(tu: Any) -> set[str]:
+    """
+    the main file of translation unit `tu` and all the files it includes, directly or not
+    """
+
+    files = {_file_key(tu.spelling)}
+    for inc in tu.get_includes():
+        files.add(_file_key(inc.include.name))
+
+    return files
+
+
+def _file_key(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path))
+
+
+def set_tag_index(tu: Any, index: TagIndex) -> None:
+    _tag_indexes[tu] = index
+
+
+def get_tag_index(tu: Any) -> TagIndex | None:
+    return _tag_indexes.get(tu)
+
+
 def get_fully_qualified_name(node: ClangNode, use_spelling_instead: bool = False) -> str:
     return "::".join(get_fully_qualified_name_parts(node, use_spelling_instead))
 
@@ -75,6 +291,15 @@ def get_fully_qualified_name_parts(node: ClangNode, use_spelling_instead: bool =
     return list(reversed(parts))
 
 
+def origin_of(node: ClangNode) -> str:
+    """
+    returns the path of the file the node is located in, empty if it has none (builtins).
+    """
+
+    f = node.location.file
+    return "" if f is None else f.name
+
+
 def is_decl(node: ClangNode) -> bool:
     return node.kind.is_declaration()
 
@@ -94,6 +319,69 @@ def get_fields(node: ClangNode) -> list[ClangNode]:
     return fields
 
 
+def has_bases(node: ClangNode) -> bool:
+    return any(kindof(c) == "cxx_base_specifier" for c in node.get_children())
+
+
+class FieldLayout:
+    """
+    position of a field in its record, in bytes, as computed by clang for the target.
+    bitfields span the bytes they touch and have no alignment of their own
+    """
+
+    def __init__(self, node: ClangNode, offset: int, size: int, align: int) -> None:
+        self.node: ClangNode = node
+        self.name: str = node.spelling
+        self.offset: int = offset
+        self.size: int = size
+        self.align: int = align
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+def get_field_layout(node: ClangNode) -> list[FieldLayout]:
+    """
+    the layout of the fields of a record, in declaration order (which is also offset order).
+    fields of base classes are not included
+    """
+
+    layout = []
+    for f in get_fields(node):
+        bit_offset = f.get_field_offsetof()
+        if bit_offset < 0:
+            raise ValueError(f"Layout of {get_fully_qualified_name(node)} is unknown, it's incomplete or dependent")
+
+        if f.is_bitfield():
+            first = bit_offset // 8
+            layout.append(FieldLayout(f, first, (bit_offset + f.get_bitfield_width() + 7) // 8 - first, 1))
+        else:
+            layout.append(FieldLayout(f, bit_offset // 8, f.type.get_size(), f.type.get_align()))
+
+    return layout
+
+
+def get_padding(node: ClangNode) -> list[tuple[int, int]]:
+    """
+    bytes of a record not covered by any field, as `(offset, size)` holes, including the tail padding
+    """
+
+    holes = []
+    end = 0
+    for fl in get_field_layout(node):
+        if fl.offset > end:
+            holes.append((end, fl.offset - end))
+
+        end = max(end, fl.end)
+
+    size = node.type.get_size()
+    if size > end:
+        holes.append((end, size - end))
+
+    return holes
+
+
 def typekind(clang_type: Any) -> str:
     return clang_type.kind.name.lower()
 
@@ -113,6 +401,10 @@ def hastags(node: ClangNode, tags: list[str]) -> list[str]:
 
 
 def collect_tags(node: ClangNode) -> list[str]:
+    index = get_tag_index(node.translation_unit)
+    if index is not None and node in index.tags_of:
+        return list(index.tags_of[node])
+
     tags = []
     for c in node.get_children():
         if kindof(c) == "annotate_attr":
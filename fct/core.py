@@ -1,11 +1,23 @@
 import os
 import sys
 import subprocess
-import clang
-import clang.cindex
-import clang.enumerations
-import clang.native
 import shutil
+import hashlib
+import tempfile
+import json
+import time
+import select
+import struct
+import stat
+import ctypes
+import threading
+import io
+import re
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TextIO, TYPE_CHECKING
+
+from collections import OrderedDict
 
 from types import ModuleType
 from genericpath import isdir, isfile
@@ -14,6 +26,20 @@ from os.path import join as joinpath
 from pathlib import Path
 from glob import glob
 from dataclasses import dataclass, field as dcfield
+from . import analysis
+
+# libclang and the worker pools are only loaded by the commands that need them, see `load_libclang`
+if TYPE_CHECKING:
+    import clang.cindex
+    from concurrent.futures import Future
+
+
+def default_cache_folder() -> str:
+    if "FCT_CACHE_DIR" in os.environ:
+        return os.environ["FCT_CACHE_DIR"]
+
+    xdg_cache = os.environ.get("XDG_CACHE_HOME", joinpath(Path.home(), ".cache"))
+    return joinpath(xdg_cache, "fct")
 
 
 def get_prjname() -> str:
@@ -30,42 +56,75 @@ class FctError(Exception):
         return self.args[0]
 
 
-CPP_INCLUDES_FLAGS = [
-    "-I/usr/include/c++/11",
-    "-I/usr/include/x86_64-linux-gnu/c++/11",
-    "-I/usr/include/c++/11/backward",
-]
-
-
 @dataclass
 class BuildOptions:
     prjname: str = dcfield(default_factory=get_prjname)
     output_folder: str = "o"
     gen_folder: str = "g"
     templs_folder: str = "t"
-    source: str = "main.cpp" or "main.c"
-    # index pointing to self.sources
+    # translation units of the project, glob patterns are accepted
+    sources: list[str] = dcfield(default_factory=lambda: ["main.cpp" or "main.c"])
+    # index pointing to self.sources, its translation unit is the one given to the periodic tools,
+    # a glob pattern in this slot must match a single file
     entry_source: int = 0
+    # sources parsed for the periodic tools, glob patterns are accepted, empty means all of self.sources.
+    # their tagged decls are merged by USR, so a type seen by more of them is generated once,
+    # those in files the entry source doesn't include are skipped, the generated headers are written for it
+    analysis_sources: list[str] = dcfield(default_factory=list)
+    # how libclang parses the sources for the periodic tools, one of PARSE_PROFILES
+    parse_profile: str = "analysis"
+    # the periodic tools only look for tagged decls in these directories, skipping system headers,
+    # None makes them traverse everything reachable from the translation unit
+    project_dirs: list[str] | None = dcfield(default_factory=lambda: ["."])
 
     cc: str = "g++" or "gcc" or "clang"
     cpp: bool = True or False
+    # the system include directories are those of `cc`, libclang is told about them by `libclang_flags`
     flags: set[str] = dcfield(default_factory=lambda: set([
         "-Wno-attributes",
-
-        # + CPP_INCLUDES_FLAGS, if cpp
-
-        "-I/usr/lib/gcc/x86_64-linux-gnu/11/include",
-        "-I/usr/local/include",
-        "-I/usr/include/x86_64-linux-gnu",
-        "-I/usr/include",
     ]))
 
     periodics: list[ModuleType] = dcfield(default_factory=list)
     manuals: list[ModuleType] = dcfield(default_factory=list)
 
+    # skips compiling and linking when the output is newer than all its inputs
+    incremental: bool = True
+    # precompiles the leading includes of the entry source once per compiler and flags, see `prepare_pch`
+    pch: bool = False
+    # number of translation units compiled in parallel, 0 means one per core
+    jobs: int = 0
+    # content addressed cache of compiled objects and executables, shared by all projects, None disables it.
+    # opt-in, by setting it (to `default_cache_folder()` for example) or $FCT_CACHE_DIR:
+    # keying an object costs a preprocessor pass of its source
+    cache_folder: str | None = dcfield(default_factory=lambda: os.environ.get("FCT_CACHE_DIR"))
+    # once the cache is larger, the least recently used entries are evicted
+    cache_max_bytes: int = 2 << 30
+    # seconds `fct watch` waits for a burst of saves to settle before regenerating
+    watch_debounce: float = 0.2
+
+    # records the duration of each phase, see `span`
+    profile: bool = False
+
     run_returncode: int | None = None
     use_exceptions_instead_of_exit: bool = False
 
+    @property
+    def source(self) -> str:
+        entry = self.sources[self.entry_source]
+        if not any(c in entry for c in "*?["):
+            return entry
+
+        # a pattern in the entry slot is only accepted when it names a single file
+        matches = resolve_sources([entry])
+        if len(matches) != 1:
+            error(f"Entry source pattern {repr(entry)} must match exactly one file, it matches {len(matches)}: {matches}")
+
+        return matches[0]
+
+    @source.setter
+    def source(self, value: str) -> None:
+        self.sources[self.entry_source] = value
+
 
 def use_c_instead(version: str = "c11") -> None:
     assert '++' not in version
@@ -76,8 +135,6 @@ def use_c_instead(version: str = "c11") -> None:
     bopt.source = "main.c"
     switch_lang_version(version)
 
-    bopt.flags = set(filter(lambda f: f not in CPP_INCLUDES_FLAGS, bopt.flags))
-
 
 def use_cpp_instead(version: str = "c++23") -> None:
     assert '++' in version
@@ -88,8 +145,6 @@ def use_cpp_instead(version: str = "c++23") -> None:
     bopt.source = "main.cpp"
     switch_lang_version(version)
 
-    bopt.flags.update(CPP_INCLUDES_FLAGS)
-
 
 def switch_lang_version(version: str) -> None:
     global bopt
@@ -133,17 +188,28 @@ use_debug_build_instead()
 
 
 HELP = """
+Usage
+    [build options] command
+
+Build options
+    -j jobs
+        Compiles up to <jobs> translation units in parallel
+    --profile
+        Prints where the time went and writes a chrome trace to `o/`
+
 Commands
     Help
         Shows this message
-    Build
+    Build [build options]
         Runs the build script to the end
-    Run
-        Builds and runs the executable
+    Run [args...]
+        Builds and runs the executable, passing it <args>, build options go before the command
     Apply(tool_name)
         Runs a manual tool named <tool_name>.py, use `.` to apply all manuals
     Prepare(header_name)
         Creates empty header <header_name>.g.h in folder `g/`
+    Watch [build options] [build [build options]]
+        Keeps running the periodic tools (and the build, if requested) each time a source or template changes
     Clear
         Removes the cached contents from `g/` and `o/` folders
 """.strip()
@@ -195,12 +261,28 @@ def run_argv() -> None:
     global args
     global args_i
     args = sys.argv[1:]
-    
+
+    try:
+        run_command()
+    finally:
+        if bopt.profile:
+            report_profile()
+
+
+def run_command() -> None:
+    global bopt
+    global args
+    global args_i
+
+    # after `run` the arguments are of the executable, options can't be told apart from them
+    fetch_build_options()
+
     match fetch_arg("Use `fct help`."):
         case "help":
             print(HELP)
         
         case "build":
+            fetch_build_options()
             build()
         
         case "run":
@@ -208,7 +290,9 @@ def run_argv() -> None:
             out_path = build()
             if out_path != None:
                 print("Running:")
-                p = subprocess.run([out_path] + args[args_i:])
+                with span("run executable"):
+                    p = subprocess.run([out_path] + args[args_i:])
+
                 bopt.run_returncode = p.returncode
         
         case "prepare":
@@ -220,9 +304,7 @@ def run_argv() -> None:
                 if fa != "force":
                     error(f"Expected 'force' instead of {repr(fa)}")
 
-            with open(header_path, "w") as h:
-                h.write(PREPARED_HEADER)
-                h.write("\n")
+            write_if_changed(header_path, PREPARED_HEADER + "\n")
         
         case "apply":
             tool_name = fetch_arg("Expected tool name")
@@ -237,6 +319,23 @@ def run_argv() -> None:
 
                 execute_tools(found_ones)
         
+        case "watch":
+            fetch_build_options()
+            also_build = False
+
+            if args_i < len(args):
+                mode = fetch_arg("")
+                if mode != "build":
+                    error(f"Expected 'build' instead of {repr(mode)}")
+
+                also_build = True
+                fetch_build_options()
+
+            if args_i < len(args):
+                error(f"Unexpected argument {repr(args[args_i])} after `watch`")
+
+            watch(also_build)
+
         case "clear":
             remove_dirs()
             make_dirs()
@@ -276,6 +375,96 @@ def fetch_arg_case_sensitive(err_msg: str) -> str:
     return arg
 
 
+def fetch_build_options() -> None:
+    """
+    consumes the options preceding the command (and those following `build` and `watch`), `--` ends them explicitly.
+    """
+
+    global args
+    global args_i
+    global bopt
+
+    while args_i < len(args) and args[args_i].startswith("-"):
+        opt = fetch_arg("")
+
+        if opt == "--":
+            break
+
+        if opt == "--profile":
+            bopt.profile = True
+            continue
+
+        if opt.startswith("-j"):
+            jobs = opt.removeprefix("-j") or fetch_arg("Expected the number of jobs after `-j`")
+            if not jobs.isdigit():
+                error(f"Expected the number of jobs instead of {repr(jobs)}")
+
+            bopt.jobs = int(jobs)
+        else:
+            error(f"Unknown build option {repr(opt)}")
+
+
+_profile_events: list[dict] = []
+_profile_lock = threading.Lock()
+_profile_origin = time.perf_counter()
+
+
+@contextmanager
+def span(name: str, cat: str = "fct") -> Iterator[None]:
+    """
+    records how long the enclosed code takes, when `bopt.profile` is enabled.
+    spans are complete events of the chrome trace format.
+    """
+
+    global bopt
+
+    if not bopt.profile:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with _profile_lock:
+            _profile_events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": (start - _profile_origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            })
+
+
+def report_profile() -> None:
+    """
+    prints the time spent per span name and writes all spans to `o/<prjname>.trace.json`,
+    which can be opened with chrome://tracing or https://ui.perfetto.dev
+    """
+
+    global bopt
+
+    totals: dict[str, list[float]] = {}
+    for e in _profile_events:
+        t = totals.setdefault(e["name"], [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += e["dur"] / 1000
+        t[2] = max(t[2], e["dur"] / 1000)
+
+    print(f"{'phase':<40}{'count':>8}{'total ms':>12}{'max ms':>12}")
+    for name, (count, total, longest) in sorted(totals.items(), key=lambda t: -t[1][1]):
+        print(f"{name:<40}{count:>8}{total:>12.1f}{longest:>12.1f}")
+
+    trace_path = joinpath(bopt.output_folder, bopt.prjname) + ".trace.json"
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": _profile_events, "displayTimeUnit": "ms"}, f)
+
+    print(f"Trace: {trace_path}")
+
+
 def cmd(s: str) -> int:
     """
     runs a manual shell command
@@ -294,16 +483,329 @@ def error(msg: str) -> None:
     sys.exit(1)
 
 
+def load_libclang() -> ModuleType:
+    """
+    imports the libclang bindings on first use, so that the commands not running the tools
+    (and `import fct` itself) don't pay for them. returns `clang.cindex`.
+    """
+
+    import clang.cindex
+    return clang.cindex
+
+
+def __getattr__(name: str) -> Any:
+    # `fct.clang` keeps working, loading libclang when first accessed
+    if name == "clang":
+        load_libclang()
+        return sys.modules["clang"]
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+PARSE_PROFILES: dict[str, list[str]] = {
+    # what a compiler front-end would do
+    "full": [],
+    # enough for the tools, which only look at declarations and their annotations:
+    # no function bodies, no end of translation unit instantiations,
+    # and a preamble precompiled on the first reparse, then reused by the next ones (`fct watch`).
+    # the detailed preprocessing record is left off, as in every profile
+    "analysis": [
+        "PARSE_SKIP_FUNCTION_BODIES",
+        "PARSE_INCOMPLETE",
+        "PARSE_PRECOMPILED_PREAMBLE",
+    ],
+}
+
+
+def parse_options_of(profile: str) -> int:
+    if profile not in PARSE_PROFILES:
+        error(f"Unknown parse profile {repr(profile)}, expected one of {list(PARSE_PROFILES)}")
+
+    options = 0
+    for o in PARSE_PROFILES[profile]:
+        options |= getattr(load_libclang().TranslationUnit, o)
+
+    return options
+
+
+_index: "clang.cindex.Index | None" = None
+# source -> (fingerprint, translation unit, reparsable), kept alive for the whole process
+_cached_tus: "dict[str, tuple[str, clang.cindex.TranslationUnit, bool]]" = {}
+
+
+@dataclass
+class CompilerProbe:
+    # `#include <...>` search directories, in search order
+    include_paths: list[str] = dcfield(default_factory=list)
+    target: str = ""
+    # builtin macros, name -> value
+    defines: dict[str, str] = dcfield(default_factory=dict)
+
+
+_compiler_probes: dict[tuple[str, str], CompilerProbe] = {}
+
+
+def probe_compiler(cc: str, lang: str) -> CompilerProbe:
+    """
+    asks `cc` for its system include directories, target triple and builtin macros when compiling `lang`.
+    the answer is cached on disk for each compiler binary, only the first run pays the compiler invocations.
+    an empty probe is returned, and not cached, if `cc` can't be run.
+    """
+
+    global bopt
+    global _compiler_probes
+
+    key = (cc, lang)
+    if key in _compiler_probes:
+        return _compiler_probes[key]
+
+    try:
+        binary = compiler_binary(cc)
+    except OSError:
+        return CompilerProbe()
+
+    probe_path = joinpath(bopt.cache_folder or bopt.output_folder, "probes", fingerprint_of([binary, lang]) + ".json")
+    try:
+        with open(probe_path) as f:
+            probe = CompilerProbe(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        with span("probe compiler", "build"):
+            probe = run_compiler_probe(cc, lang)
+
+        os.makedirs(os.path.dirname(probe_path), exist_ok=True)
+        write_if_changed(probe_path, json.dumps(probe.__dict__))
+
+    _compiler_probes[key] = probe
+    return probe
+
+
+def run_compiler_probe(cc: str, lang: str) -> CompilerProbe:
+    probe = CompilerProbe()
+
+    # the search list is printed on stderr, between these two lines
+    p = subprocess.run([cc, "-x", lang, "-E", "-v", "-"], input="", capture_output=True, text=True)
+    in_search_list = False
+    for line in p.stderr.splitlines():
+        if line.startswith("#include <...> search starts here:"):
+            in_search_list = True
+        elif line.startswith("End of search list."):
+            in_search_list = False
+        elif in_search_list and not line.endswith("(framework directory)"):
+            probe.include_paths.append(os.path.normpath(line.strip()))
+
+    p = subprocess.run([cc, "-dumpmachine"], capture_output=True, text=True)
+    probe.target = p.stdout.strip()
+
+    p = subprocess.run([cc, "-x", lang, "-dM", "-E", "-"], input="", capture_output=True, text=True)
+    for line in p.stdout.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) >= 2 and parts[0] == "#define":
+            probe.defines[parts[1]] = parts[2] if len(parts) == 3 else ""
+
+    return probe
+
+
+def libclang_flags() -> list[str]:
+    """
+    the flags libclang parses with: the build flags, plus the system include directories and target of `bopt.cc`,
+    so that libclang sees the same headers the compiler does.
+    the builtin macros of `bopt.cc` are not passed: libclang defines its own,
+    and those of another compiler would make the headers take branches meant for it.
+    """
+
+    global bopt
+
+    probe = probe_compiler(bopt.cc, "c++" if bopt.cpp else "c")
+    flags = sorted(bopt.flags)
+
+    if probe.target != "":
+        flags.append(f"--target={probe.target}")
+
+    for path in probe.include_paths:
+        flags += ["-isystem", path]
+
+    return flags
+
+
+def plan_tu(source: str) -> tuple[str, int, str, str, str]:
+    """
+    how `parse_tu` gets the translation unit of `source`: one of
+    "resident" (the one of a previous call), "reparse" (the previous one, reparsed), "load" (from `o/`) or "parse".
+    returns the plan along with the parse options, fingerprint, ast path and stamp path.
+    """
+
+    global bopt
+    global _cached_tus
+
+    options = parse_options_of(bopt.parse_profile)
+    fingerprint = fingerprint_of(["libclang", source, str(options)] + libclang_flags())
+    ast_path = joinpath(bopt.output_folder, source.replace(os.sep, "__")) + ".ast"
+    stamp_path = ast_path + ".stamp"
+    stale = stale_inputs(stamp_path, fingerprint)
+    plan = "parse"
+
+    if source in _cached_tus and _cached_tus[source][0] == fingerprint and stale is not None:
+        if stale == []:
+            plan = "resident"
+        # a loaded ast can't be reparsed, but a parsed resident translation unit can
+        elif stale == [source] and _cached_tus[source][2]:
+            plan = "reparse"
+
+    if plan == "parse" and stale == [] and isfile(ast_path):
+        plan = "load"
+
+    return plan, options, fingerprint, ast_path, stamp_path
+
+
+def parse_tu(source: str) -> "clang.cindex.TranslationUnit":
+    """
+    parses `source` with libclang, reusing previous work when possible:
+    the translation unit of a previous call in this process is reparsed when only `source` changed,
+    otherwise the one saved in `o/` by a previous run is loaded when none of its inputs changed.
+    any change to the flags or to an included header means a full parse.
+    """
+
+    global bopt
+    global _index
+    global _cached_tus
+
+    cindex = load_libclang()
+    if _index is None:
+        with span("Index.create", "libclang"):
+            _index = cindex.Index.create()
+
+    plan, options, fingerprint, ast_path, stamp_path = plan_tu(source)
+
+    if plan == "resident":
+        return _cached_tus[source][1]
+
+    if plan == "reparse":
+        tu = _cached_tus[source][1]
+        with span("reparse", "libclang"):
+            tu.reparse()
+
+        save_tu(tu, source, ast_path, stamp_path, fingerprint)
+        return tu
+
+    if plan == "load":
+        try:
+            # libclang validates the inputs again and refuses the ast if any changed
+            with span("load cached ast", "libclang"):
+                tu = _index.read(ast_path)
+
+            _cached_tus[source] = (fingerprint, tu, False)
+            return tu
+        except cindex.TranslationUnitLoadError:
+            pass
+
+    with span("parse", "libclang"):
+        tu = _index.parse(source, libclang_flags(), options=options)
+
+    save_tu(tu, source, ast_path, stamp_path, fingerprint)
+
+    _cached_tus[source] = (fingerprint, tu, True)
+    return tu
+
+
+def prefetch_tus(sources: list[str]) -> None:
+    """
+    parses the sources that `parse_tu` would have to parse from scratch in worker processes,
+    which save their asts in `o/`, so that `parse_tu` only has to load them.
+    separate processes, since a translation unit can't be shared by threads anyway
+    and a libclang crash on one source doesn't take down the whole run.
+    workers are forked, spawning them would run the build script again.
+    """
+
+    global bopt
+
+    to_parse = []
+    for source in sources:
+        plan, options, fingerprint, ast_path, stamp_path = plan_tu(source)
+        if plan == "parse":
+            to_parse.append((source, libclang_flags(), options, ast_path, stamp_path, fingerprint))
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # a single one is parsed in process, and stays reparsable
+    if len(to_parse) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return
+
+    jobs = bopt.jobs if bopt.jobs > 0 else (os.cpu_count() or 1)
+    with span("prefetch_tus", "libclang"):
+        with ProcessPoolExecutor(max_workers=min(jobs, len(to_parse)), mp_context=multiprocessing.get_context("fork")) as pool:
+            for f in [pool.submit(_parse_and_save_tu, *args) for args in to_parse]:
+                # failures are parsed again, and reported, by `parse_tu`
+                f.exception()
+
+
+def _parse_and_save_tu(
+    source: str,
+    flags: list[str],
+    options: int,
+    ast_path: str,
+    stamp_path: str,
+    fingerprint: str
+) -> None:
+    tu = load_libclang().Index.create().parse(source, flags, options=options)
+    save_tu(tu, source, ast_path, stamp_path, fingerprint)
+
+
+def analysis_sources() -> list[str]:
+    """
+    the sources parsed for the periodic tools, the entry source first.
+    """
+
+    global bopt
+
+    others = resolve_sources(bopt.analysis_sources if len(bopt.analysis_sources) > 0 else bopt.sources)
+    return [bopt.source] + [s for s in others if s != os.path.normpath(bopt.source)]
+
+
+def save_tu(
+    tu: "clang.cindex.TranslationUnit",
+    source: str,
+    ast_path: str,
+    stamp_path: str,
+    fingerprint: str
+) -> None:
+    # an include that didn't resolve is not among the dependencies, creating it later wouldn't invalidate the stamp,
+    # so such a translation unit is never reused
+    if any(d.spelling.endswith("file not found") for d in tu.diagnostics):
+        if isfile(stamp_path):
+            os.remove(stamp_path)
+
+        return
+
+    # a loaded ast may still be mapped from `ast_path`, never write over it in place
+    tmp_path = ast_path + ".tmp"
+    try:
+        with span("save ast", "libclang"):
+            tu.save(tmp_path)
+    except load_libclang().TranslationUnitSaveError:
+        # the cache is only an optimization
+        return
+
+    os.replace(tmp_path, ast_path)
+
+    deps = [source] + [inc.include.name for inc in tu.get_includes()]
+    write_stamp(stamp_path, fingerprint, deps)
+
+
 def execute_tools(tools: list[ModuleType]) -> None:
     global bopt
 
     if len(tools) == 0:
         return
 
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    sources = analysis_sources()
     try:
-        index = clang.cindex.Index.create()
-        tu = index.parse(bopt.source, bopt.flags)
-    except clang.cindex.TranslationUnitLoadError:
+        prefetch_tus(sources)
+        with span("parse_tu", "libclang"):
+            tus = [parse_tu(s) for s in sources]
+    except load_libclang().TranslationUnitLoadError:
         error("Clang Call Failed")
         return # unreachable
 
@@ -314,23 +816,432 @@ def execute_tools(tools: list[ModuleType]) -> None:
     #
     #    error("Compilation Failed")
 
+    # a single traversal shared by all the tools, the tools are given the entry translation unit,
+    # but the tagged decls they collect from it are those of all the translation units
+    tu = tus[0]
+    with span("build_tag_index", "analysis"):
+        index = analysis.build_merged_tag_index(tus, bopt.project_dirs)
+
+    # the generated headers are written for the entry source, which can't see these
+    for fqn, node in index.skipped.items():
+        print(f"Skipped: `{fqn}` is defined in {os.path.normpath(analysis.origin_of(node))}, which {bopt.source} doesn't include")
+
     # we execute the scripts even if there are analysis errors
     # from libclang, this is a wanted behavior because those errors
     # might be caused by a missing symbol, and that symbol may be missing
     # because it has still to be generated by one of these periodic scripts
-    for tool in tools:
+    deps = tools_dependencies(tools)
+    # libclang doesn't allow using the translation units from more threads at once,
+    # so the tools analyze it one at a time, while the headers of the others are rendered and written
+    tu_lock = threading.Lock()
+
+    def run_tool(tool: ModuleType) -> SystemExit | None:
         try:
-            gs: list[CppBuilder] = tool.execute(tu)
+            with tu_lock, span(f"{tool.__name__}.execute", "tool"):
+                gs: list[CppBuilder] = tool.execute(tu)
+
             for g in gs:
-                hpath = joinpath(bopt.gen_folder, g.name + ".g.h")
-                with open(hpath, "w") as h:
-                    th = TEMPLATE_HEADER
-                    th = th.replace("<includes>", g.build_includes())
-                    th = th.replace("<content>", g.build())
-                    h.write(th)
-                    h.write("\n")
-        except Exception as e:
-            error(f"Exception from periodic tool, {tool.__name__} says {e.__class__} {e.args}")
+                with span(f"emit {g.name}.g.h", "io"):
+                    emit_header(g)
+        except SystemExit as e:
+            # the tool called `error`, which already reported it, the process exits once the pool is drained
+            return e
+
+        return None
+
+    jobs = bopt.jobs if bopt.jobs > 0 else (os.cpu_count() or 1)
+    pending = list(tools)
+    running: "dict[Future, ModuleType]" = {}
+    done: list[ModuleType] = []
+    failed: list[tuple[ModuleType, Exception]] = []
+    exits: list[SystemExit] = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(pending) > 0 or len(running) > 0:
+            for tool in list(pending):
+                if len(failed) == 0 and len(exits) == 0 and all(d in done for d in deps[tool]):
+                    pending.remove(tool)
+                    running[pool.submit(run_tool, tool)] = tool
+
+            if len(running) == 0:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in finished:
+                tool = running.pop(f)
+                if f.exception() is not None:
+                    failed.append((tool, f.exception()))
+                elif f.result() is not None:
+                    exits.append(f.result())
+                else:
+                    done.append(tool)
+
+    if len(failed) > 0:
+        tool, e = min(failed, key=lambda f: tools.index(f[0]))
+        error(f"Exception from periodic tool, {tool.__name__} says {e.__class__} {e.args}")
+
+    if len(exits) > 0:
+        sys.exit(exits[0].code)
+
+
+def tools_dependencies(tools: list[ModuleType]) -> dict[ModuleType, list[ModuleType]]:
+    """
+    a tool can declare the names of what it generates in a module level `PRODUCES` list,
+    usually the names of its generated headers (`[cpp.name]`),
+    and what it needs to be generated before it runs in a `CONSUMES` list.
+    tools declaring nothing are independent from each other.
+    returns the tools each tool has to wait for.
+    """
+
+    producers: dict[str, list[ModuleType]] = {}
+    for tool in tools:
+        for p in getattr(tool, "PRODUCES", []):
+            producers.setdefault(p, []).append(tool)
+
+    deps = {}
+    for tool in tools:
+        deps[tool] = []
+        for c in getattr(tool, "CONSUMES", []):
+            deps[tool].extend(t for t in producers.get(c, []) if t is not tool and t not in deps[tool])
+
+    # the scheduler would wait forever on a cycle
+    visiting, visited = [], []
+    def visit(tool: ModuleType) -> None:
+        if tool in visited:
+            return
+
+        if tool in visiting:
+            error(f"Periodic tools depend on each other: {' -> '.join(t.__name__ for t in visiting + [tool])}")
+
+        visiting.append(tool)
+        for d in deps[tool]:
+            visit(d)
+
+        visiting.pop()
+        visited.append(tool)
+
+    for tool in tools:
+        visit(tool)
+
+    return deps
+
+
+def digest_of_file(path: str) -> str | None:
+    """
+    returns the sha256 hexdigest of the file content, None if the file doesn't exist.
+    """
+
+    h = hashlib.sha256()
+
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+
+    return h.hexdigest()
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    writes `content` to `path` only when it differs from what is already on disk,
+    so that unchanged generated headers keep their mtime and don't make the
+    including translation units look stale.
+    the replacement is atomic, a reader never sees an half written header.
+    returns True if the file was (re)written.
+    """
+
+    with ChangedOnlyWriter(path) as w:
+        w.write(content)
+
+    return w.changed
+
+
+class ChangedOnlyWriter(io.TextIOBase):
+    """
+    buffered text writer for `path` that streams into a temporary file while hashing what it writes.
+    on close it atomically replaces `path` with it, unless the content turned out to be the same.
+    nothing is replaced if the writer is left because of an exception.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.hash = hashlib.sha256()
+        self.changed: bool = False
+
+        # not `mkstemp`, which creates the file as 0600: created like this it gets the mode `open()` would give it
+        while True:
+            self.tmp_path = joinpath(os.path.dirname(path) or ".", f".{os.path.basename(path)}.{os.urandom(6).hex()}.tmp")
+            try:
+                fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                break
+            except FileExistsError:
+                continue
+
+        self.file = os.fdopen(fd, "wb", buffering=1 << 16)
+
+    def write(self, s: str) -> int:
+        data = s.encode()
+        self.hash.update(data)
+        self.file.write(data)
+        return len(s)
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.file.close()
+
+        if exc_type is None and digest_of_file(self.path) != self.hash.hexdigest():
+            # a replaced file keeps its mode
+            try:
+                os.chmod(self.tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass
+
+            os.replace(self.tmp_path, self.path)
+            self.changed = True
+        else:
+            os.unlink(self.tmp_path)
+
+        super().__exit__(exc_type, exc_value, traceback)
+
+
+def emit_header(g: "CppBuilder") -> bool:
+    """
+    streams the header generated by `g` into `g/<name>.g.h`, see `ChangedOnlyWriter`,
+    or its shards into `g/<name>/` if it is sharded (see `CppBuilder`).
+    returns True if any header was (re)written.
+    """
+
+    global bopt
+
+    header_path = joinpath(bopt.gen_folder, g.name + ".g.h")
+
+    if g.shard_by == "":
+        return write_header(header_path, g.build_includes(), lambda out: g.write_to(out))
+
+    shards_dir = joinpath(bopt.gen_folder, g.name)
+    os.makedirs(shards_dir, exist_ok=True)
+
+    shards = g.shards()
+    shared = shards.pop(g.SHARED_SHARD)
+    shared_include = f'#include "{g.SHARED_SHARD}.g.h"'
+    changed = write_header(
+        joinpath(shards_dir, g.SHARED_SHARD + ".g.h"),
+        g.build_includes(),
+        lambda out: g.write_pieces_to(out, g.pieces, shared)
+    )
+
+    for shard, pieces in shards.items():
+        changed |= write_header(
+            joinpath(shards_dir, shard + ".g.h"),
+            "\n".join([shared_include] + [f'#include "{s}.g.h"' for s in g.shard_uses(shard)]),
+            lambda out: g.write_pieces_to(out, [], pieces)
+        )
+
+    # shards of types that don't exist anymore
+    for h in glob(joinpath(shards_dir, "*.g.h")):
+        if os.path.basename(h).removesuffix(".g.h") not in [g.SHARED_SHARD] + list(shards):
+            os.remove(h)
+            changed = True
+
+    umbrella_includes = [f'#include "{g.name}/{shard}.g.h"' for shard in [g.SHARED_SHARD] + list(shards)]
+    changed |= write_header(header_path, "\n".join(umbrella_includes), lambda out: None)
+
+    return changed
+
+
+def write_header(path: str, includes: str, write_content: Callable[[TextIO], None]) -> bool:
+    """
+    streams `TEMPLATE_HEADER` into `path`, see `ChangedOnlyWriter`.
+    """
+
+    before_includes, _, rest = TEMPLATE_HEADER.partition("<includes>")
+    before_content, _, after_content = rest.partition("<content>")
+
+    with ChangedOnlyWriter(path) as w:
+        w.write(before_includes)
+        w.write(includes)
+        w.write(before_content)
+        write_content(w)
+        w.write(after_content)
+        w.write("\n")
+
+    return w.changed
+
+
+WATCHED_EXTENSIONS = (".c", ".cc", ".cpp", ".cxx", ".h", ".hh", ".hpp", ".hxx", ".t.h")
+
+
+def watch(also_build: bool = False) -> None:
+    """
+    regenerates the headers (and rebuilds, if `also_build`) each time
+    a c/c++ source, header or template of the project changes, until interrupted.
+    the process stays alive, so the clang index, the parsed translation unit
+    and the imported tools are kept resident between regenerations.
+    """
+
+    global bopt
+
+    # a failing regeneration must not end the session
+    use_exceptions = bopt.use_exceptions_instead_of_exit
+    bopt.use_exceptions_instead_of_exit = True
+    watcher = _DirWatcher(".", ignored=[bopt.output_folder, bopt.gen_folder])
+
+    try:
+        changed = ["(initial run)"]
+        while True:
+            print(f"Changed: {', '.join(changed)}")
+
+            try:
+                if also_build:
+                    build()
+                else:
+                    execute_tools(bopt.periodics)
+            except FctError as e:
+                print(f"Error: {e.msg}")
+
+            print("Watching, Ctrl+C to stop")
+            changed = watcher.wait_changes(bopt.watch_debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        bopt.use_exceptions_instead_of_exit = use_exceptions
+
+
+class _DirWatcher:
+    """
+    watches a directory tree for changes to files with one of the `WATCHED_EXTENSIONS`,
+    through inotify when available, by polling mtimes otherwise.
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, root: str, ignored: list[str]) -> None:
+        self.root: str = root
+        self.ignored: list[str] = [os.path.normpath(i) for i in ignored]
+        self.wds: dict[int, str] = {}
+        self.fd: int = -1
+        self.mtimes: dict[str, int] = {}
+
+        try:
+            self.libc = ctypes.CDLL(None, use_errno=True)
+            self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            self.fd = -1
+
+        if self.fd >= 0:
+            for d in self.dirs():
+                self.add_dir(d)
+        else:
+            self.mtimes = self.scan()
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def is_ignored(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        name = os.path.basename(path)
+        return (name.startswith(".") and name != ".") or path in self.ignored
+
+    def dirs(self) -> list[str]:
+        found = []
+        for dirpath, dirnames, _ in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not self.is_ignored(joinpath(dirpath, d))]
+            found.append(dirpath)
+
+        return found
+
+    def add_dir(self, d: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(d), self.MASK)
+        if wd >= 0:
+            self.wds[wd] = d
+
+    def scan(self) -> dict[str, int]:
+        mtimes = {}
+        for d in self.dirs():
+            for name in os.listdir(d):
+                path = joinpath(d, name)
+                if path.endswith(WATCHED_EXTENSIONS) and isfile(path):
+                    mtimes[path] = os.stat(path).st_mtime_ns
+
+        return mtimes
+
+    def wait_changes(self, debounce: float) -> list[str]:
+        """
+        blocks until at least one watched file changes,
+        then waits for the burst of changes to settle for `debounce` seconds.
+        """
+
+        changed = []
+        timeout = None
+
+        while True:
+            batch = self.read_changes(timeout)
+            if len(batch) == 0 and len(changed) > 0:
+                return changed
+
+            for c in batch:
+                if c not in changed:
+                    changed.append(c)
+
+            if len(changed) > 0:
+                timeout = debounce
+
+    def read_changes(self, timeout: float | None) -> list[str]:
+        if self.fd < 0:
+            return self.poll_changes(timeout)
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return []
+
+        buf = os.read(self.fd, 1 << 16)
+        changed = []
+        offset = 0
+
+        while offset < len(buf):
+            wd, mask, _, length = struct.unpack_from("iIII", buf, offset)
+            name = os.fsdecode(buf[offset + 16 : offset + 16 + length].rstrip(b"\0"))
+            offset += 16 + length
+
+            if wd not in self.wds:
+                continue
+
+            path = joinpath(self.wds[wd], name)
+            if mask & self.IN_ISDIR:
+                if mask & self.IN_CREATE and not self.is_ignored(path):
+                    self.add_dir(path)
+            elif path.endswith(WATCHED_EXTENSIONS):
+                changed.append(os.path.normpath(path))
+
+        return changed
+
+    def poll_changes(self, timeout: float | None) -> list[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            mtimes = self.scan()
+            changed = [
+                os.path.normpath(p)
+                for p in mtimes.keys() | self.mtimes.keys()
+                if mtimes.get(p) != self.mtimes.get(p)
+            ]
+            self.mtimes = mtimes
+
+            if len(changed) > 0 or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+            time.sleep(self.POLL_INTERVAL)
 
 
 def change_source(source: str) -> None:
@@ -341,11 +1252,14 @@ def change_source(source: str) -> None:
 def build() -> str | None:
     """
     builds input c/c++ sources to `o/` folder.
+    each translation unit is compiled to its own object file, in parallel, then they are linked.
     returns the output path of the executable, None if compilation failed.
     the user can replace this function at runtime with a custom one that calls this under the hood,
     but it needs to be done before calling `run_tools`.
     """
 
+    from concurrent.futures import ThreadPoolExecutor
+
     global bopt
     
     output_path = joinpath(bopt.output_folder, bopt.prjname) + ".out"
@@ -354,10 +1268,421 @@ def build() -> str | None:
     if bopt.cpp and cc == "gcc":
         cc = "g++"
 
-    execute_tools(bopt.periodics)
-    r = cmd(f"{cc} {bopt.source} -o {output_path} {flags_joined}")
+    with span("execute_tools"):
+        execute_tools(bopt.periodics)
+
+    try:
+        sources = resolve_sources()
+        pch_includes, pch_header = [], None
+        if bopt.pch:
+            pch_includes = include_prefix(bopt.source)
+            with span("pch", "compiler"):
+                pch_header = prepare_pch(cc, bopt.source, pch_includes)
+
+        def compile_tu(source: str) -> str | None:
+            # the precompiled includes are forced only in units that would include them first anyway
+            if pch_header is None or include_prefix(source)[:len(pch_includes)] != pch_includes:
+                return compile_object(cc, source)
+
+            # the depfile doesn't mention a precompiled header, it is recorded explicitly
+            return compile_object(cc, source, [f"-include {pch_header}"], glob(pch_header + ".*ch"))
+
+        jobs = bopt.jobs if bopt.jobs > 0 else (os.cpu_count() or 1)
+        with span("compile"), ThreadPoolExecutor(max_workers=jobs) as pool:
+            objects = list(pool.map(compile_tu, sources))
+
+        if None in objects:
+            return None
+
+        # the flags set has no stable order, so the fingerprint is made on the sorted ones
+        stamp_path = output_path + ".stamp"
+        fingerprint = fingerprint_of([cc, output_path] + objects + sorted(bopt.flags))
+        if bopt.incremental and is_up_to_date(output_path, stamp_path, fingerprint):
+            print(f"Up to date: {output_path}")
+            return output_path
+
+        cache_key = None
+        if bopt.cache_folder is not None:
+            cache_key = cache_key_of("executable", cc, [digest_of_file(o) for o in objects] + sorted(bopt.flags))
+            if cache_fetch(cache_key, output_path):
+                write_stamp(stamp_path, fingerprint, objects)
+                return output_path
+
+        with span("link", "compiler"):
+            r = cmd(f"{cc} {' '.join(objects)} -o {output_path} {flags_joined}")
+        if r != 0:
+            return None
+
+        if cache_key is not None:
+            cache_store(cache_key, output_path)
+
+        write_stamp(stamp_path, fingerprint, objects)
+        return output_path
+    finally:
+        # once per build, it walks the whole cache
+        if _cache_grown:
+            with span("evict cache", "io"):
+                evict_cache()
+
+
+def resolve_sources(patterns: list[str] | None = None) -> list[str]:
+    """
+    expands the glob patterns in `patterns` (`bopt.sources` by default), keeping the order and dropping duplicates.
+    """
+
+    global bopt
+
+    sources = []
+    for s in bopt.sources if patterns is None else patterns:
+        matches = sorted(glob(s, recursive=True)) if any(c in s for c in "*?[") else [s]
+        for m in matches:
+            m = os.path.normpath(m)
+            if m not in sources:
+                sources.append(m)
+
+    return sources
+
+
+def compile_object(
+    cc: str,
+    source: str,
+    extra_flags: list[str] = [],
+    extra_deps: list[str] = []
+) -> str | None:
+    """
+    compiles a single translation unit to `o/`, unless its object is up to date.
+    returns the path of the object file, None if compilation failed.
+    """
+
+    global bopt
+
+    object_path = joinpath(bopt.output_folder, source.replace(os.sep, "__")) + ".o"
+    depfile_path = object_path.removesuffix(".o") + ".d"
+    stamp_path = object_path + ".stamp"
+    flags = sorted(bopt.flags) + extra_flags
+
+    fingerprint = fingerprint_of([cc, source, object_path] + flags)
+    if bopt.incremental and is_up_to_date(object_path, stamp_path, fingerprint):
+        return object_path
+
+    if bopt.cache_folder is None:
+        with span(f"compile {source}", "compiler"):
+            r = cmd(f"{cc} -c {source} -o {object_path} {' '.join(flags)} -MMD -MF {depfile_path}")
+
+        if r != 0:
+            return None
+
+        write_stamp(stamp_path, fingerprint, read_depfile(depfile_path) + extra_deps)
+        return object_path
+
+    # the cache is keyed by the preprocessed source, which is way cheaper to produce than the object
+    preprocessed_path = object_path.removesuffix(".o") + (".ii" if bopt.cpp else ".i")
+    with span(f"preprocess {source}", "compiler"):
+        r = cmd(f"{cc} -E {source} -o {preprocessed_path} {' '.join(flags)} -MMD -MF {depfile_path}")
+
+    if r != 0:
+        return None
+
+    cache_key = cache_key_of("object", cc, [digest_of_file(preprocessed_path)] + flags)
+    os.remove(preprocessed_path)
+
+    if not cache_fetch(cache_key, object_path):
+        with span(f"compile {source}", "compiler"):
+            r = cmd(f"{cc} -c {source} -o {object_path} {' '.join(flags)}")
+
+        if r != 0:
+            return None
+
+        cache_store(cache_key, object_path)
+
+    write_stamp(stamp_path, fingerprint, read_depfile(depfile_path) + extra_deps)
+    return object_path
+
+
+_compiler_identities: dict[str, str] = {}
+
+
+def compiler_binary(cc: str) -> str:
+    """
+    identifies the compiler binary `cc` resolves to, without running it.
+    """
+
+    path = os.path.realpath(shutil.which(cc) or cc)
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def compiler_identity(cc: str) -> str:
+    """
+    identifies the compiler binary `cc` resolves to, and its version.
+    """
+
+    global _compiler_identities
+
+    if cc not in _compiler_identities:
+        p = subprocess.run([shutil.which(cc) or cc, "--version"], capture_output=True, text=True)
+        version = p.stdout.split("\n", 1)[0]
+
+        _compiler_identities[cc] = f"{compiler_binary(cc)}:{version}"
+
+    return _compiler_identities[cc]
+
+
+def cache_key_of(kind: str, cc: str, parts: list[str]) -> str:
+    global bopt
+
+    lang = "c++" if bopt.cpp else "c"
+    key_parts = [kind, compiler_identity(cc), lang] + parts
+
+    # debug info embeds the working directory, such outputs can only be shared inside the same project
+    if any(f.startswith("-g") for f in bopt.flags):
+        key_parts.append(os.getcwd())
+
+    return fingerprint_of(key_parts)
+
+
+def cache_entry_path(key: str) -> str:
+    global bopt
+    return joinpath(bopt.cache_folder, key[:2], key[2:])
+
+
+def cache_fetch(key: str, dst: str) -> bool:
+    """
+    copies the cache entry `key` to `dst`, returns False if there is no such entry.
+    """
+
+    entry = cache_entry_path(key)
+
+    try:
+        shutil.copyfile(entry, dst)
+        os.chmod(dst, os.stat(entry).st_mode)
+        # the mtime tells when the entry was last used
+        os.utime(entry)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+_cache_grown: bool = False
+
+
+def cache_store(key: str, src: str) -> None:
+    """
+    stores a copy of `src` as cache entry `key`.
+    `build` evicts the least recently used entries at its end, if the cache grew over `bopt.cache_max_bytes`.
+    """
+
+    entry = cache_entry_path(key)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(entry))
+    os.close(fd)
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, entry)
+
+    global _cache_grown
+    _cache_grown = True
+
+
+def evict_cache() -> None:
+    global bopt
+    global _cache_grown
+
+    _cache_grown = False
+
+    entries = []
+    total = 0
+
+    for e in glob(joinpath(bopt.cache_folder, "??", "*")):
+        try:
+            st = os.stat(e)
+        except FileNotFoundError:
+            # evicted by another job in the meanwhile
+            continue
+
+        entries.append((st.st_mtime, st.st_size, e))
+        total += st.st_size
+
+    entries.sort()
+    for _, size, e in entries:
+        if total <= bopt.cache_max_bytes:
+            break
+
+        try:
+            os.remove(e)
+        except FileNotFoundError:
+            pass
+
+        total -= size
+
+
+def include_prefix(source: str) -> list[str]:
+    """
+    returns the `#include` lines at the top of `source`, before any other directive or code.
+    quoted includes are made absolute, so that they can be included from anywhere.
+    """
 
-    return output_path if r == 0 else None
+    includes = []
+    in_comment = False
+
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+
+            if in_comment:
+                in_comment = "*/" not in line
+                continue
+
+            if line == "" or line.startswith("//") or line == "#pragma once":
+                continue
+
+            if line.startswith("/*"):
+                in_comment = "*/" not in line
+                continue
+
+            if not line.startswith("#include"):
+                break
+
+            header = line.removeprefix("#include").strip()
+            if header.startswith('"'):
+                path = os.path.abspath(joinpath(os.path.dirname(source), header.strip('"')))
+                header = f'"{path}"'
+
+            includes.append(f"#include {header}")
+
+    return includes
+
+
+def prepare_pch(cc: str, source: str, includes: list[str]) -> str | None:
+    """
+    precompiles `includes` into `o/pch/<variant>/`, where the variant depends on the compiler and flags,
+    so that switching between debug and release builds doesn't invalidate each other's header.
+    returns the header to force with `-include`, the compiler picks the precompiled one next to it.
+    returns None if there is nothing to precompile or the precompilation failed.
+    """
+
+    global bopt
+
+    if len(includes) == 0:
+        return None
+
+    variant = fingerprint_of([cc] + sorted(bopt.flags))[:16]
+    pch_dir = joinpath(bopt.output_folder, "pch", variant)
+    os.makedirs(pch_dir, exist_ok=True)
+
+    header_path = joinpath(pch_dir, os.path.basename(source) + ".pch.h")
+    pch_path = header_path + (".pch" if "clang" in os.path.basename(cc) else ".gch")
+    depfile_path = header_path + ".d"
+    stamp_path = pch_path + ".stamp"
+
+    write_if_changed(header_path, "\n".join(includes) + "\n")
+
+    fingerprint = fingerprint_of([cc, header_path] + sorted(bopt.flags))
+    if is_up_to_date(pch_path, stamp_path, fingerprint):
+        return header_path
+
+    lang = "c++-header" if bopt.cpp else "c-header"
+    r = cmd(f"{cc} -x {lang} {header_path} -o {pch_path} {' '.join(bopt.flags)} -MMD -MF {depfile_path}")
+    if r != 0:
+        return None
+
+    write_stamp(stamp_path, fingerprint, read_depfile(depfile_path))
+    return header_path
+
+
+def fingerprint_of(parts: list[str]) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode())
+        h.update(b"\0")
+
+    return h.hexdigest()
+
+
+def read_depfile(path: str) -> list[str]:
+    """
+    parses a make rule produced by `-MMD -MF <path>` and returns its prerequisites.
+    """
+
+    try:
+        with open(path) as f:
+            rule = f.read()
+    except FileNotFoundError:
+        return []
+
+    rule = rule.replace("\\\n", " ")
+    # only the first rule matters, `-MP` may add phony ones for each header
+    rule = rule.split("\n", 1)[0]
+    _, _, prerequisites = rule.partition(": ")
+
+    deps = []
+    # escaped spaces are part of the path
+    for d in prerequisites.replace("\\ ", "\0").split():
+        deps.append(d.replace("\0", " "))
+
+    return deps
+
+
+def write_stamp(stamp_path: str, fingerprint: str, deps: list[str]) -> None:
+    """
+    records the state of the inputs an output was built from,
+    to be later checked with `is_up_to_date`.
+    """
+
+    files = {}
+    for d in deps:
+        try:
+            st = os.stat(d)
+        except FileNotFoundError:
+            continue
+
+        files[d] = [st.st_mtime_ns, st.st_size, digest_of_file(d)]
+
+    with open(stamp_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "files": files}, f)
+
+
+def is_up_to_date(output_path: str, stamp_path: str, fingerprint: str) -> bool:
+    """
+    true when `output_path` exists and was built with the same `fingerprint`
+    from inputs whose content didn't change since.
+    """
+
+    return isfile(output_path) and stale_inputs(stamp_path, fingerprint) == []
+
+
+def stale_inputs(stamp_path: str, fingerprint: str) -> list[str] | None:
+    """
+    returns the inputs recorded in the stamp whose content changed since,
+    None when there is no usable stamp or it was made with a different `fingerprint`.
+    the mtime is only used as a fast path, a touched but identical input is not stale.
+    """
+
+    try:
+        with open(stamp_path) as f:
+            stamp = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if stamp.get("fingerprint") != fingerprint or len(stamp.get("files", {})) == 0:
+        return None
+
+    stale = []
+    for path, (mtime_ns, size, digest) in stamp["files"].items():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stale.append(path)
+            continue
+
+        if st.st_mtime_ns == mtime_ns and st.st_size == size:
+            continue
+
+        if st.st_size != size or digest_of_file(path) != digest:
+            stale.append(path)
+
+    return stale
 
 
 class CppPieceBuilder:
@@ -419,26 +1744,54 @@ class CppPieceBuilder:
         self.indent_level -= 1
     
     def build(self) -> str:
+        out = io.StringIO()
+        self.write_to(out)
+        return out.getvalue()
+
+    def write_to(self, out: TextIO) -> None:
         if self.enclose_in_body:
             self.unbody()
-        
-        return self.single_indent + self.decl + "\n" + "".join(self.data)
+
+        out.write(self.single_indent + self.decl + "\n")
+        out.writelines(self.data)
 
 
 class CppBuilder:
+    """
+    when `shard_by` is "key" or "origin", the generated header `g/<name>.g.h` only includes
+    the shards in folder `g/<name>/`: one per group of pieces (see `add`), or per source file of origin of the pieces.
+    each shard holds the definitions of its pieces, while `_shared.g.h`, included by all of them,
+    holds the pieces added as `shared` and the declarations of all the pieces,
+    and which includes the shards its pieces use (see `add_use`).
+    a change to a single type then only rewrites its own shard,
+    and code including just that shard doesn't need to be recompiled for changes to other types.
+    """
+
+    SHARED_SHARD = "_shared"
+
     def __init__(
         self,
         name: str,
         includes: list[str] = [],
         single_indent: str = " " * 4,
         subnamespace: str = "",
-        auto_subnamespace: bool = False
+        auto_subnamespace: bool = False,
+        shard_by: str = ""
     ) -> None:
+        assert shard_by in ["", "key", "origin"]
+
         self.name: str = name
         self.includes: list[str] = includes
         self.data: dict[str, CppPieceBuilder] = {}
         self.single_indent: str = single_indent
         self.subnamespace: str = subnamespace
+        self.shard_by: str = shard_by
+        # key -> shard of the piece
+        self.shard_of: dict[str, str] = {}
+        # group -> shard of its pieces
+        self.shard_of_group: dict[str, str] = {}
+        # group -> groups its pieces use, see `add_use`
+        self.uses: dict[str, list[str]] = {}
 
         if auto_subnamespace:
             self.subnamespace = self.name
@@ -447,36 +1800,134 @@ class CppBuilder:
     def pieces(self) -> list[CppPieceBuilder]:
         return list(self.data.values())
     
-    def add(self, key: str, piece: CppPieceBuilder) -> None:
+    def add(
+        self,
+        key: str,
+        piece: CppPieceBuilder,
+        origin: str = "",
+        shared: bool = False,
+        group: str = ""
+    ) -> None:
+        """
+        origin
+            the source file the piece was generated from, used when sharding by origin
+
+        shared
+            the piece is needed by the others, when sharding it is put in the shared header
+
+        group
+            pieces of the same group share a shard when sharding by key, defaults to `key`.
+            tools generating more pieces for a type pass its fully qualified name,
+            so that the shard of the type holds all of them
+        """
+
         assert not self.has(key), f"Piece builder with key=`{key}` is already registered in cpp builder"
         self.data[key] = piece
+
+        if shared:
+            self.shard_of[key] = self.SHARED_SHARD
+            return
+
+        shard = group or key
+        if self.shard_by == "origin":
+            shard = os.path.basename(origin) or "unknown_origin"
+
+        # never starts with `_`, so it can't clash with the shared shard
+        self.shard_of[key] = re.sub(r"[^A-Za-z0-9_]+", "_", shard).strip("_")
+        self.shard_of_group.setdefault(group or key, self.shard_of[key])
+
+    def add_use(self, group: str, used_group: str) -> None:
+        """
+        the pieces of `group` use those of `used_group`, the functions of a nested struct for example,
+        so when sharding the shard of the first includes the shard of the other
+        """
+
+        uses = self.uses.setdefault(group, [])
+        if used_group not in uses:
+            uses.append(used_group)
+
+    def shard_uses(self, shard: str) -> list[str]:
+        """
+        returns the other shards the pieces of `shard` use, see `add_use`.
+        """
+
+        used = []
+        for group, groups in self.uses.items():
+            if self.shard_of_group.get(group) != shard:
+                continue
+
+            for g in groups:
+                s = self.shard_of_group.get(g)
+                if s is not None and s != shard and s not in used:
+                    used.append(s)
+
+        return used
     
     def has(self, key: str) -> bool:
         return key in self.data
 
+    def clear(self) -> None:
+        """
+        tools call it at the start of `execute`, since a tool may be executed more than once by the same process (`fct watch`)
+        and the pieces of the previous run must not leak into the next one.
+        """
+
+        self.data.clear()
+        self.shard_of.clear()
+        self.shard_of_group.clear()
+        self.uses.clear()
+
+    def shards(self) -> dict[str, list[CppPieceBuilder]]:
+        """
+        returns the pieces of each shard, in order, the shared one first.
+        """
+
+        shards = {self.SHARED_SHARD: []}
+        for key, p in self.data.items():
+            shards.setdefault(self.shard_of[key], []).append(p)
+
+        return shards
+
     def build(self) -> str:
+        out = io.StringIO()
+        self.write_to(out)
+        return out.getvalue()
+
+    def write_to(self, out: TextIO) -> None:
+        """
+        writes the declarations of all the pieces, then their definitions, in order,
+        without assembling them in memory first.
+        """
+
+        self.write_pieces_to(out, self.pieces, self.pieces)
+
+    def write_pieces_to(
+        self,
+        out: TextIO,
+        declared: list[CppPieceBuilder],
+        defined: list[CppPieceBuilder]
+    ) -> None:
         ind = self.single_indent
-        declarations = []
-        definitions = []
 
-        for p in self.pieces:
-            declarations.append(ind)
-            declarations.append(p.head)
-            declarations.append(";\n")
+        if self.subnamespace != "":
+            out.write(f"namespace {self.subnamespace}\n{{\n")
+
+        for p in declared:
+            out.write(ind)
+            out.write(p.head)
+            out.write(";\n")
 
+        out.write(f"\n{ind}// ------------- //\n\n")
+
+        for p in defined:
             if not p.is_def:
                 continue
 
-            definitions.append(p.build())
-            definitions.append("\n")
-
-        DECL_SEP_DEF = f"\n{ind}// ------------- //\n\n"
-        built = "".join(declarations) + DECL_SEP_DEF + "".join(definitions)
+            p.write_to(out)
+            out.write("\n")
 
         if self.subnamespace != "":
-            built = f"namespace {self.subnamespace}\n{{\n{built}\n}}\n"
-
-        return built
+            out.write("\n}\n")
     
     def build_includes(self) -> str:
         b = []
@@ -489,39 +1940,70 @@ class CppBuilder:
         return "\n".join(b)
 
 
-_cached_templs = {}
+TEMPL_CACHE_SIZE = 256
+TEMPL_START_TOKEN = "/*FCT_START_TEMPLATE*/"
+
+# template path -> (mtime_ns, size, template body after the start token)
+_parsed_templs: dict[str, tuple[int, int, str]] = {}
+# (template path, params, mtime_ns, size) -> instantiation, least recently used first
+_cached_templs: OrderedDict[tuple, str] = OrderedDict()
+
+
 def templ(name: str, params: list[tuple[str, str]] = []) -> CppPieceBuilder:
+    """
+    instantiates template `t/<name>.t.h` with `params` as macros.
+    instantiations are cached by template, params and template file state,
+    so an edited template is picked up by long lived processes (`fct watch`).
+    """
+
     global _cached_templs
     global bopt
 
-    if name in _cached_templs:
-        return _cached_templs[name]
+    path = joinpath(bopt.templs_folder, name + ".t.h")
+    st = os.stat(path)
+    key = (path, tuple(params), st.st_mtime_ns, st.st_size)
 
-    pb = CppPieceBuilder()
-    _cached_templs[name] = pb
+    if key in _cached_templs:
+        _cached_templs.move_to_end(key)
+        return piece(_cached_templs[key])
 
-    fct_start_token = f"/*FCT_START_TEMPLATE*/"
-    with open(joinpath(bopt.templs_folder, name + ".t.h")) as t:
-        templ = t.read()
+    instance = []
+    for pname, pvalue in params:
+        pvalue = pvalue.replace("\n", "\\\n").strip().removesuffix("\\")
+        instance.append(f"#define {pname} {pvalue}\n")
 
-        try:
-            templ_start_idx = templ.index(fct_start_token)
-        except ValueError:
-            templ_start_idx = 0
-            fct_start_token = ""
+    instance.append(parse_templ(path, st))
 
-        templ = templ[templ_start_idx+len(fct_start_token):]
+    for pname, _ in params:
+        instance.append(f"#undef {pname}\n")
 
-        for pname, pvalue in params:
-            pvalue = pvalue.replace("\n", "\\\n").strip().removesuffix("\\")
-            pb.add_flat(f"#define {pname} {pvalue}\n")
+    _cached_templs[key] = "".join(instance)
+    while len(_cached_templs) > TEMPL_CACHE_SIZE:
+        _cached_templs.popitem(last=False)
 
-        pb.add_flat(templ)
+    return piece(_cached_templs[key])
 
-        for pname, _ in params:
-            pb.add_flat(f"#undef {pname}\n")
 
-    return pb
+def parse_templ(path: str, st: os.stat_result) -> str:
+    """
+    returns the body of the template at `path`, which starts after `TEMPL_START_TOKEN` if present.
+    """
+
+    global _parsed_templs
+
+    cached = _parsed_templs.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    with open(path) as t:
+        body = t.read()
+
+    _, token, after_token = body.partition(TEMPL_START_TOKEN)
+    if token != "":
+        body = after_token
+
+    _parsed_templs[path] = (st.st_mtime_ns, st.st_size, body)
+    return body
 
 
 def piece(c: str) -> CppPieceBuilder:
@@ -1,3 +1,13 @@
-from . import enum_info
-from . import soa
-from . import struct_repr
\ No newline at end of file
+import importlib
+
+
+# tools are imported on first access (`fct_toolbox.soa` or `from fct_toolbox import soa`),
+# importing the package alone doesn't load any of them
+TOOLS = ["enum_info", "layout", "soa", "serialize", "struct_hash", "struct_repr"]
+
+
+def __getattr__(name):
+    if name in TOOLS:
+        return importlib.import_module(f".{name}", __name__)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -7,13 +7,12 @@ import fct
 
 fa = fct.analysis
 CppPieceBuilder = fct.CppPieceBuilder
-cindex = fct.clang.cindex
-CursorKind = cindex.CursorKind
-TranslationUnit = cindex.TranslationUnit
+TranslationUnit = fa.ClangTranslationUnit
 ClangNode = fa.ClangNode
 
 
-cpp = fct.CppBuilder("enum_info", ["<string>", "<sstream>"])
+cpp = fct.CppBuilder("enum_info", ["<string>", "<string_view>", "<optional>", "<cstdint>", "<cstddef>", "<type_traits>"])
+PRODUCES = [cpp.name]
 
 
 def collect_enum_members(enum: ClangNode) -> list[ClangNode]:
@@ -23,21 +22,92 @@ def collect_enum_members(enum: ClangNode) -> list[ClangNode]:
     ))
 
 
+def enum_info_hash(seed: int, s: str) -> int:
+    """
+    32 bit fnv-1a with a seed, must match the generated `g::enum_info_hash`.
+    the final avalanche (from murmur3) is needed because the low bits of fnv-1a
+    only depend on the low bits of the seed and of the characters
+    """
+
+    h = (0x811C9DC5 ^ seed) & 0xFFFFFFFF
+    for b in s.encode():
+        h ^= b
+        h = (h * 0x01000193) & 0xFFFFFFFF
+
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 16
+
+    return h
+
+
+def perfect_hash(keys: list[str]) -> tuple[list[int], list[int]]:
+    """
+    hash and displace: keys are bucketed by their unseeded hash, then for each bucket,
+    the largest first, a seed is searched that sends all its keys to free slots.
+    buckets with a single key directly store their slot as `-slot - 1`.
+    returns the displacement of each bucket and the key index in each slot.
+    """
+
+    n = len(keys)
+    buckets: list[list[int]] = [[] for _ in range(n)]
+    for i, k in enumerate(keys):
+        buckets[enum_info_hash(0, k) % n].append(i)
+
+    displacements = [0] * n
+    slots: list[int | None] = [None] * n
+
+    for b in sorted(range(n), key=lambda b: -len(buckets[b])):
+        bucket = buckets[b]
+        if len(bucket) <= 1:
+            break
+
+        seed = 1
+        while True:
+            bucket_slots = [enum_info_hash(seed, keys[i]) % n for i in bucket]
+            if len(set(bucket_slots)) == len(bucket) and all(slots[s] is None for s in bucket_slots):
+                break
+
+            seed += 1
+            if seed >= 2**31:
+                raise ValueError(f"No perfect hash found for {keys}")
+
+        displacements[b] = seed
+        for i, s in zip(bucket, bucket_slots):
+            slots[s] = i
+
+    free_slots = [s for s in range(n) if slots[s] is None]
+    for b in range(n):
+        if len(buckets[b]) == 1:
+            s = free_slots.pop()
+            displacements[b] = -s - 1
+            slots[s] = buckets[b][0]
+
+    return displacements, slots
+
+
+def literal(value: int) -> str:
+    return f"{value}ULL" if value >= 2**63 else str(value)
+
+
+def is_unsigned(t: fa.ClangType) -> bool:
+    return fa.typekind(t.get_canonical()) in ["bool", "char_u", "uchar", "char16", "char32", "ushort", "uint", "ulong", "ulonglong", "uint128"]
+
+
 def gen_enum_info(fqn: str, enum: ClangNode) -> CppPieceBuilder:
     members = collect_enum_members(enum)
+    fallback = f"{fqn}::(?)"
 
-    repr_pb = CppPieceBuilder(f"static std::string repr({fqn} self)")
-    repr_pb.line("switch (self)")
-    repr_pb.body()
-    
+    # aliases share the name of the first member with their value
+    names_by_value: dict[int, str] = {}
     for m in members:
-        repr_pb.line(f"case {fqn}::{m.spelling}:")
-        repr_pb.indent()
-        repr_pb.line(f'return "{fqn}::{m.spelling}";')
-        repr_pb.unindent()
+        names_by_value.setdefault(m.enum_value, f"{fqn}::{m.spelling}")
 
-    repr_pb.unbody()
-    repr_pb.line(f'return (std::stringstream() << "{fqn}::(" << (int)self << ")").str();')
+    values = sorted(names_by_value)
+    names = [names_by_value[v] for v in values]
+    is_dense = len(values) > 0 and values[-1] - values[0] + 1 == len(values)
 
     pb = CppPieceBuilder()
     pb.add_flat(
@@ -45,9 +115,101 @@ f"""
 template<>
 struct EnumInfo<{fqn}>
 {{
+    using Underlying = std::underlying_type_t<{fqn}>;
+
     static constexpr uint Count = {len(members)};
+""")
+
+    repr_pb = CppPieceBuilder(f"static constexpr std::string_view repr({fqn} self)")
+
+    if len(values) > 0:
+        pb.line()
+        pb.line("// member names sorted by value, aliases excluded")
+        pb.line(f"static constexpr std::string_view Names[] = {{ {', '.join(f'{chr(34)}{n}{chr(34)}' for n in names)} }};")
+
+        repr_pb.line("auto v = static_cast<Underlying>(self);")
+
+        if is_dense:
+            # contiguous values, the name is at their offset from the first one.
+            # `v >= 0` is always true when unsigned, and warned about (-Wtype-limits)
+            if values[0] == 0 and is_unsigned(enum.enum_type):
+                repr_pb.line(f"if (v <= Underlying({literal(values[-1])}))")
+            else:
+                repr_pb.line(f"if (v >= Underlying({literal(values[0])}) && v <= Underlying({literal(values[-1])}))")
+            repr_pb.indent()
+            repr_pb.line(f"return Names[std::size_t(v - Underlying({literal(values[0])}))];")
+            repr_pb.unindent()
+        else:
+            pb.line(f"static constexpr Underlying Values[] = {{ {', '.join(f'Underlying({literal(v)})' for v in values)} }};")
+
+            # sparse values, binary search
+            repr_pb.line("std::size_t lo = 0;")
+            repr_pb.line(f"std::size_t hi = {len(values)};")
+            repr_pb.line("while (lo < hi)")
+            repr_pb.body()
+            repr_pb.line("std::size_t mid = (lo + hi) / 2;")
+            repr_pb.line("if (Values[mid] < v)")
+            repr_pb.indent()
+            repr_pb.line("lo = mid + 1;")
+            repr_pb.unindent()
+            repr_pb.line("else")
+            repr_pb.indent()
+            repr_pb.line("hi = mid;")
+            repr_pb.unindent()
+            repr_pb.unbody()
+            repr_pb.line(f"if (lo < {len(values)} && Values[lo] == v)")
+            repr_pb.indent()
+            repr_pb.line("return Names[lo];")
+            repr_pb.unindent()
+    else:
+        repr_pb.line("(void)self;")
+
+    repr_pb.line(f'return "{fallback}";')
+
+    # keeps the value of unknown members, for when an allocation is acceptable
+    repr_value_pb = CppPieceBuilder(f"static std::string repr_value({fqn} self)")
+    repr_value_pb.line("auto r = repr(self);")
+    repr_value_pb.line(f'if (r != "{fallback}")')
+    repr_value_pb.indent()
+    repr_value_pb.line("return std::string(r);")
+    repr_value_pb.unindent()
+    repr_value_pb.line(f'return "{fqn}::(" + std::to_string(static_cast<Underlying>(self)) + ")";')
+
+    from_string_pb = CppPieceBuilder(f"static constexpr std::optional<{fqn}> from_string(std::string_view s)")
+    if len(members) > 0:
+        keys = [m.spelling for m in members]
+        displacements, slots = perfect_hash(keys)
 
+        pb.line()
+        pb.line("// perfect hash of the member names, see `from_string`")
+        pb.line(f"static constexpr std::int32_t HashDisplacements[] = {{ {', '.join(map(str, displacements))} }};")
+        pb.line(f"static constexpr std::string_view HashNames[] = {{ {', '.join(f'{chr(34)}{keys[i]}{chr(34)}' for i in slots)} }};")
+        pb.line(f"static constexpr {fqn} HashValues[] = {{ {', '.join(f'{fqn}::{keys[i]}' for i in slots)} }};")
+
+        from_string_pb.line(f'constexpr std::string_view prefix = "{fqn}::";')
+        from_string_pb.line("if (s.compare(0, prefix.size(), prefix) == 0)")
+        from_string_pb.indent()
+        from_string_pb.line("s.remove_prefix(prefix.size());")
+        from_string_pb.unindent()
+        from_string_pb.line()
+        from_string_pb.line(f"std::int32_t d = HashDisplacements[enum_info_hash(0, s) % {len(members)}];")
+        from_string_pb.line(f"std::size_t slot = d < 0 ? std::size_t(-d - 1) : enum_info_hash(std::uint32_t(d), s) % {len(members)};")
+        from_string_pb.line("if (HashNames[slot] == s)")
+        from_string_pb.indent()
+        from_string_pb.line("return HashValues[slot];")
+        from_string_pb.unindent()
+    else:
+        from_string_pb.line("(void)s;")
+
+    from_string_pb.line("return std::nullopt;")
+
+    pb.add_flat(
+f"""
+    // `{fallback}` for values that are not members, never allocates
     {repr_pb.build()}
+    {repr_value_pb.build()}
+    // accepts both `member` and `{fqn}::member`
+    {from_string_pb.build()}
 }};
 """)
 
@@ -58,12 +220,14 @@ def emit_enum_info_to_cb(enum: ClangNode) -> None:
     global cpp
 
     fqn = fa.get_fully_qualified_name(enum)
-    cpp.add(fqn, gen_enum_info(fqn, enum))
+    cpp.add(fqn, gen_enum_info(fqn, enum), origin=fa.origin_of(enum))
 
 
 def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
     global cpp
 
+    cpp.clear()
+
     cpp.add("unbound_enum_info", fct.piece(
 """
 template<typename EnumT>
@@ -71,8 +235,25 @@ struct EnumInfo
 {
     
 };
+
+constexpr std::uint32_t enum_info_hash(std::uint32_t seed, std::string_view s)
+{
+    std::uint32_t h = 0x811C9DC5u ^ seed;
+    for (char c : s)
+    {
+        h ^= static_cast<unsigned char>(c);
+        h *= 0x01000193u;
+    }
+
+    h ^= h >> 16;
+    h *= 0x85EBCA6Bu;
+    h ^= h >> 13;
+    h *= 0xC2B2AE35u;
+    h ^= h >> 16;
+    return h;
+}
 """
-    ))
+    ), shared=True)
 
     tagged_enums = fa.collect_tagged_decls(tu.cursor, ["enum_info"], ["enum_decl"])
     for en in tagged_enums:
@@ -0,0 +1,141 @@
+import fct
+import os
+
+
+# TOOL CONFIG
+
+LAYOUT_OF_TAGS = ["layout", "soa", "struct_repr", "struct_repr_inline", "serialize"]
+"""
+structs tagged with any of these notes are analyzed
+"""
+
+CACHE_LINE_SIZE = 64
+
+SUGGEST_PACKED_ORDER = True
+"""
+if true, the report suggests a field order that minimizes padding, for the structs that have some
+"""
+
+PRINT_REPORT = False
+"""
+the report is always written to `o/layout.txt`, if true it's also printed when it changes
+"""
+
+
+fa = fct.analysis
+CppPieceBuilder = fct.CppPieceBuilder
+TranslationUnit = fa.ClangTranslationUnit
+ClangNode = fa.ClangNode
+
+
+cpp = fct.CppBuilder("layout", ["<cstddef>"])
+PRODUCES = [cpp.name]
+
+
+def align_up(offset: int, align: int) -> int:
+    return (offset + align - 1) // align * align
+
+
+def packed_order(layout: list[fa.FieldLayout], struct_align: int) -> tuple[list[fa.FieldLayout], int]:
+    """
+    fields sorted by decreasing alignment (then size), which leaves no padding between fields
+    whose sizes are multiple of their alignment, and the resulting struct size
+    """
+
+    order = sorted(layout, key=lambda fl: (-fl.align, -fl.size))
+
+    end = 0
+    for fl in order:
+        end = align_up(end, fl.align) + fl.size
+
+    return order, align_up(end, struct_align)
+
+
+def straddles_cache_line(fl: fa.FieldLayout) -> bool:
+    """
+    whether the field crosses a cache line boundary, for a struct that starts at one
+    """
+
+    return fl.size > 0 and fl.offset // CACHE_LINE_SIZE != (fl.end - 1) // CACHE_LINE_SIZE
+
+
+def has_known_layout(cls: ClangNode) -> bool:
+    return cls.type.get_size() >= 0 and all(f.get_field_offsetof() >= 0 for f in fa.get_fields(cls))
+
+
+def gen_report(fqn: str, cls: ClangNode) -> list[str]:
+    size = cls.type.get_size()
+    align = cls.type.get_align()
+    lines_count = (size + CACHE_LINE_SIZE - 1) // CACHE_LINE_SIZE
+
+    if fa.has_bases(cls):
+        return [f"{fqn}: size {size}, align {align}, {lines_count} cache line(s), has base classes, fields not analyzed"]
+
+    layout = fa.get_field_layout(cls)
+    holes = fa.get_padding(cls)
+    padding = sum(s for _, s in holes)
+
+    report = [f"{fqn}: size {size}, align {align}, {padding} padding byte(s), {lines_count} cache line(s)"]
+    report.append(f"    {'offset':>8}{'size':>8}{'align':>8}  field")
+
+    # fields and holes, by offset
+    rows = [(fl.offset, fl.size, str(fl.align), fl.name + ("  (straddles a cache line)" if straddles_cache_line(fl) else "")) for fl in layout]
+    rows += [(offset, s, "", "(padding)") for offset, s in holes]
+    for offset, s, a, name in sorted(rows, key=lambda r: r[0]):
+        report.append(f"    {offset:>8}{s:>8}{a:>8}  {name}")
+
+    is_bitfield = any(fl.node.is_bitfield() for fl in layout)
+    if SUGGEST_PACKED_ORDER and padding > 0 and not is_bitfield:
+        order, packed_size = packed_order(layout, align)
+        if packed_size < size:
+            report.append(f"    suggested order: {', '.join(fl.name for fl in order)}")
+            report.append(f"    packed size {packed_size}, saves {size - packed_size} byte(s) ({(size - packed_size) * 100 // size}%)")
+
+    return report
+
+
+def gen_layout_asserts(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    size = cls.type.get_size()
+    align = cls.type.get_align()
+
+    pb = CppPieceBuilder()
+    pb.line(f"// layout of `{fqn}` seen by fct, any change to it fails the build until the next generation")
+    pb.line(f'static_assert(sizeof({fqn}) == {size}, "size of `{fqn}` changed");')
+    pb.line(f'static_assert(alignof({fqn}) == {align}, "alignment of `{fqn}` changed");')
+
+    # `offsetof` is only portable on standard layout types, and needs access to the field
+    if cls.type.is_pod() and not fa.has_bases(cls):
+        for fl in fa.get_field_layout(cls):
+            if fl.name == "" or fl.node.is_bitfield() or fl.node.access_specifier.name != "PUBLIC":
+                continue
+
+            pb.line(f'static_assert(offsetof({fqn}, {fl.name}) == {fl.offset}, "offset of `{fqn}.{fl.name}` changed");')
+
+    return pb
+
+
+def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
+    global cpp
+
+    cpp.clear()
+
+    report = []
+    tagged_structs = fa.collect_tagged_decls(tu.cursor, LAYOUT_OF_TAGS, ["struct_decl", "class_decl"])
+    for cls in tagged_structs:
+        fqn = fa.get_fully_qualified_name(cls)
+        if cpp.has(fqn):
+            continue
+
+        if not has_known_layout(cls):
+            report += [f"{fqn}: layout unknown, incomplete or containing incomplete types", ""]
+            continue
+
+        cpp.add(fqn, gen_layout_asserts(fqn, cls), origin=fa.origin_of(cls))
+        report += gen_report(fqn, cls)
+        report.append("")
+
+    os.makedirs(fct.bopt.output_folder, exist_ok=True)
+    if fct.write_if_changed(os.path.join(fct.bopt.output_folder, "layout.txt"), "\n".join(report)) and PRINT_REPORT:
+        print("\n".join(report))
+
+    return [cpp]
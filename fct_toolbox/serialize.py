@@ -0,0 +1,449 @@
+import fct
+import hashlib
+
+
+# TOOL CONFIG
+
+SERIALIZE_VERSION = 1
+"""
+written in the header of every buffer, readers reject buffers with a different version.
+bump it when the meaning of the data changes but the layout doesn't
+"""
+
+
+fa = fct.analysis
+CppPieceBuilder = fct.CppPieceBuilder
+TranslationUnit = fa.ClangTranslationUnit
+ClangNode = fa.ClangNode
+ClangType = fa.ClangType
+
+
+cpp = fct.CppBuilder("serialize", [
+    "<string>", "<string_view>", "<vector>", "<algorithm>",
+    "<cstring>", "<cstdint>", "<cstddef>", "<bit>", "<type_traits>"
+])
+PRODUCES = [cpp.name]
+
+
+SCALAR_TYPE_KINDS = [
+    "bool",
+    "char_u", "uchar", "char16", "char32", "ushort", "uint", "ulong", "ulonglong",
+    "char_s", "schar", "wchar", "short", "int", "long", "longlong",
+    "float", "double",
+    "enum",
+]
+
+# (expression, byte offset in the record, canonical type)
+Leaf = tuple[str, int, ClangType]
+
+
+def is_std_string(t: ClangType) -> bool:
+    return t.get_canonical().spelling == "std::basic_string<char>"
+
+
+def unsupported(where: str, t: ClangType) -> ValueError:
+    return ValueError(f"Field `{where}` of type `{t.spelling}` can't be serialized")
+
+
+def fixed_leaves(where: str, t: ClangType, expr: str, offset: int) -> list[Leaf] | None:
+    """
+    the scalars (and arrays of scalars) of a type whose encoding has a fixed size,
+    at their offset in memory, or None when the encoding has a variable size
+    """
+
+    t = t.get_canonical()
+    tk = fa.typekind(t)
+
+    if tk in SCALAR_TYPE_KINDS:
+        return [(expr, offset, t)]
+
+    if tk == "constantarray":
+        if fa.typekind(t.get_array_element_type().get_canonical()) not in SCALAR_TYPE_KINDS:
+            raise unsupported(where, t)
+
+        return [(expr, offset, t)]
+
+    if tk == "record":
+        if is_std_string(t):
+            return None
+
+        # the fields of base classes would be silently skipped
+        if fa.has_bases(t.get_declaration()):
+            raise ValueError(f"`{where}` of type `{t.spelling}` has base classes, they can't be serialized")
+
+        leaves = []
+        for f in fa.get_fields(t.get_declaration()):
+            if f.is_bitfield():
+                raise unsupported(f"{where}.{f.spelling}", f.type)
+
+            sub = fixed_leaves(f"{where}.{f.spelling}", f.type, f"{expr}.{f.spelling}", offset + f.get_field_offsetof() // 8)
+            if sub is None:
+                return None
+
+            leaves += sub
+
+        return leaves
+
+    raise unsupported(where, t)
+
+
+def describe_type(where: str, t: ClangType) -> str:
+    t = t.get_canonical()
+    tk = fa.typekind(t)
+
+    if tk in SCALAR_TYPE_KINDS:
+        return f"{tk}{t.get_size()}"
+
+    if tk == "constantarray":
+        elem = t.get_array_element_type().get_canonical()
+        return f"{fa.typekind(elem)}{elem.get_size()}[{t.get_array_size()}]"
+
+    if tk == "record":
+        if is_std_string(t):
+            return "string"
+
+        return "{" + describe_layout(where, t.get_declaration()) + "}"
+
+    raise unsupported(where, t)
+
+
+def describe_layout(fqn: str, cls: ClangNode) -> str:
+    """
+    everything the encoding of `cls` depends on, two types with the same description are binary compatible
+    """
+
+    leaves = fixed_leaves(fqn, cls.type, "", 0)
+    if leaves is not None:
+        return f"fixed{cls.type.get_size()}:" + ";".join(
+            f"{expr}@{offset}:{describe_type(fqn + expr, t)}" for expr, offset, t in leaves
+        )
+
+    return "variable:" + ";".join(
+        f".{f.spelling}:{describe_type(f'{fqn}.{f.spelling}', f.type)}" for f in fa.get_fields(cls)
+    )
+
+
+def layout_hash(fqn: str, cls: ClangNode) -> int:
+    return int.from_bytes(hashlib.sha256(describe_layout(fqn, cls).encode()).digest()[:8], "little")
+
+
+def is_flat(cls: ClangNode, leaves: list[Leaf] | None) -> bool:
+    """
+    the whole struct can be memcpy-ed on little endian machines, when its fields leave no padding
+    """
+
+    return leaves is not None and sum(t.get_size() for _, _, t in leaves) == cls.type.get_size()
+
+
+def gen_serial_layout(fqn: str, cls: ClangNode, leaves: list[Leaf] | None) -> CppPieceBuilder:
+    size = cls.type.get_size()
+
+    pb = CppPieceBuilder()
+    pb.add_flat(
+f"""
+template<>
+struct SerialLayout<{fqn}>
+{{
+    static constexpr std::uint64_t Hash = {hex(layout_hash(fqn, cls))}ULL;
+    static constexpr bool IsFixed = {"true" if leaves is not None else "false"};
+    static constexpr bool IsFlat = {"true" if is_flat(cls, leaves) else "false"} && std::is_trivially_copyable_v<{fqn}>;
+"""
+    )
+
+    if leaves is not None:
+        pb.line(f"static constexpr size_t RecordSize = {size};")
+        pb.line()
+        pb.line("// the encoding of fixed structs mirrors their memory layout as seen by fct")
+        pb.line(f'static_assert(sizeof({fqn}) == RecordSize, "layout of `{fqn}` differs from the one seen by fct");')
+
+    pb.unindent()
+    pb.line("};")
+
+    return pb
+
+
+def gen_serialize_fields(fqn: str, cls: ClangNode, leaves: list[Leaf] | None) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline void serialize_fields(std::string& out, {fqn} const& self)")
+
+    if leaves is not None:
+        pb.line(f"char record[{cls.type.get_size()}] = {{}};")
+        for expr, offset, t in leaves:
+            if fa.typekind(t) == "constantarray":
+                esize = t.get_array_element_type().get_size()
+                pb.line(f"for (size_t i = 0; i < {t.get_array_size()}; i++)")
+                pb.indent()
+                pb.line(f"serial_put(record + {offset} + i * {esize}, self{expr}[i]);")
+                pb.unindent()
+            else:
+                pb.line(f"serial_put(record + {offset}, self{expr});")
+
+        pb.line("out.append(record, sizeof(record));")
+        return pb
+
+    for f in fa.get_fields(cls):
+        fvalue = f"self.{f.spelling}"
+        t = f.type.get_canonical()
+        tk = fa.typekind(t)
+
+        if tk in SCALAR_TYPE_KINDS:
+            pb.line(f"serial_write(out, {fvalue});")
+        elif tk == "constantarray":
+            pb.line(f"for (auto const& e : {fvalue})")
+            pb.indent()
+            pb.line("serial_write(out, e);")
+            pb.unindent()
+        elif is_std_string(t):
+            pb.line(f"serial_write_string(out, {fvalue});")
+        else:
+            emit_serialize_to_cb(t.get_declaration())
+            cpp.add_use(fqn, fa.get_fully_qualified_name(t.get_declaration()))
+            pb.line(f"serialize_fields(out, {fvalue});")
+
+    return pb
+
+
+def gen_deserialize_fields(fqn: str, cls: ClangNode, leaves: list[Leaf] | None) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline bool deserialize_fields(std::string_view& in, {fqn}& self)")
+
+    if leaves is not None:
+        size = cls.type.get_size()
+        pb.line(f"if (in.size() < {size})")
+        pb.indent()
+        pb.line("return false;")
+        pb.unindent()
+        pb.line()
+        for expr, offset, t in leaves:
+            if fa.typekind(t) == "constantarray":
+                esize = t.get_array_element_type().get_size()
+                pb.line(f"for (size_t i = 0; i < {t.get_array_size()}; i++)")
+                pb.indent()
+                pb.line(f"serial_get(in.data() + {offset} + i * {esize}, self{expr}[i]);")
+                pb.unindent()
+            else:
+                pb.line(f"serial_get(in.data() + {offset}, self{expr});")
+
+        pb.line(f"in.remove_prefix({size});")
+        pb.line("return true;")
+        return pb
+
+    for f in fa.get_fields(cls):
+        fvalue = f"self.{f.spelling}"
+        t = f.type.get_canonical()
+        tk = fa.typekind(t)
+
+        if tk in SCALAR_TYPE_KINDS:
+            pb.line(f"if (!serial_read(in, {fvalue}))")
+        elif tk == "constantarray":
+            pb.line(f"for (auto& e : {fvalue})")
+            pb.indent()
+            pb.line("if (!serial_read(in, e))")
+            pb.indent()
+            pb.line("return false;")
+            pb.unindent()
+            pb.unindent()
+            continue
+        elif is_std_string(t):
+            pb.line(f"if (!serial_read_string(in, {fvalue}))")
+        else:
+            pb.line(f"if (!deserialize_fields(in, {fvalue}))")
+
+        pb.indent()
+        pb.line("return false;")
+        pb.unindent()
+
+    pb.line("return true;")
+    return pb
+
+
+def gen_serialize(fqn: str, flat: bool) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline void serialize(std::string& out, {fqn} const* items, size_t count)")
+    pb.line(f"serial_write_header(out, SerialLayout<{fqn}>::Hash, count);")
+    pb.line()
+
+    if flat:
+        pb.line(f"if constexpr (std::endian::native == std::endian::little && SerialLayout<{fqn}>::IsFlat)")
+        pb.body()
+        pb.line(f"out.append(reinterpret_cast<char const*>(items), count * sizeof({fqn}));")
+        pb.line("return;")
+        pb.unbody()
+        pb.line()
+
+    pb.line("for (size_t i = 0; i < count; i++)")
+    pb.indent()
+    pb.line("serialize_fields(out, items[i]);")
+    pb.unindent()
+
+    return pb
+
+
+def gen_deserialize(fqn: str, fixed: bool, flat: bool) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline bool deserialize(std::string_view& in, std::vector<{fqn}>& items)")
+    pb.line("// `in` is only consumed on success")
+    pb.line("auto rest = in;")
+    pb.line("std::uint64_t count;")
+    pb.line(f"if (!serial_read_header(rest, SerialLayout<{fqn}>::Hash, count))")
+    pb.indent()
+    pb.line("return false;")
+    pb.unindent()
+    pb.line()
+    pb.line("auto old_size = items.size();")
+
+    if fixed:
+        pb.line(f"if (rest.size() / SerialLayout<{fqn}>::RecordSize < count)")
+        pb.indent()
+        pb.line("return false;")
+        pb.unindent()
+
+    if flat:
+        pb.line()
+        pb.line(f"if constexpr (std::endian::native == std::endian::little && SerialLayout<{fqn}>::IsFlat)")
+        pb.body()
+        pb.line("items.resize(old_size + count);")
+        pb.line(f"std::memcpy(items.data() + old_size, rest.data(), count * sizeof({fqn}));")
+        pb.line(f"in = rest.substr(count * sizeof({fqn}));")
+        pb.line("return true;")
+        pb.unbody()
+
+    pb.add_flat(
+f"""
+        // every item takes at least a byte, a corrupted count can't make this reserve too much
+        items.reserve(old_size + std::min<std::uint64_t>(count, rest.size()));
+        for (std::uint64_t i = 0; i < count; i++)
+        {{
+            {fqn} item{{}};
+            if (!deserialize_fields(rest, item))
+            {{
+                items.erase(items.begin() + old_size, items.end());
+                return false;
+            }}
+
+            items.push_back(std::move(item));
+        }}
+
+        in = rest;
+        return true;
+""")
+
+    return pb
+
+
+def emit_serialize_to_cb(cls: ClangNode) -> None:
+    global cpp
+
+    fqn = fa.get_fully_qualified_name(cls)
+    if cpp.has(fqn):
+        return
+
+    leaves = fixed_leaves(fqn, cls.type, "", 0)
+    origin = fa.origin_of(cls)
+
+    # reserved first, nested structs are emitted while generating the fields
+    cpp.add(fqn, gen_serial_layout(fqn, cls, leaves), origin=origin, group=fqn)
+    cpp.add(f"{fqn} serialize_fields", gen_serialize_fields(fqn, cls, leaves), origin=origin, group=fqn)
+    cpp.add(f"{fqn} deserialize_fields", gen_deserialize_fields(fqn, cls, leaves), origin=origin, group=fqn)
+    flat = is_flat(cls, leaves)
+    cpp.add(f"{fqn} serialize", gen_serialize(fqn, flat), origin=origin, group=fqn)
+    cpp.add(f"{fqn} deserialize", gen_deserialize(fqn, leaves is not None, flat), origin=origin, group=fqn)
+
+
+def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
+    global cpp
+
+    cpp.clear()
+
+    cpp.add("unbound_serialize", fct.piece(
+f"""
+template<typename StructT>
+struct SerialLayout
+{{
+
+}};
+
+// buffer header: magic, version, layout hash, item count
+constexpr std::uint32_t SerialMagic = 0x31544346; // "FCT1"
+constexpr std::uint32_t SerialVersion = {SERIALIZE_VERSION};
+
+// everything is encoded little endian
+inline void serial_to_le(char* bytes, size_t size)
+{{
+    if constexpr (std::endian::native == std::endian::big)
+        std::reverse(bytes, bytes + size);
+}}
+
+template<typename T>
+inline void serial_put(char* dst, T const& value)
+{{
+    std::memcpy(dst, &value, sizeof(T));
+    serial_to_le(dst, sizeof(T));
+}}
+
+template<typename T>
+inline void serial_get(char const* src, T& value)
+{{
+    char bytes[sizeof(T)];
+    std::memcpy(bytes, src, sizeof(T));
+    serial_to_le(bytes, sizeof(T));
+    std::memcpy(&value, bytes, sizeof(T));
+}}
+
+template<typename T>
+inline void serial_write(std::string& out, T const& value)
+{{
+    char bytes[sizeof(T)];
+    serial_put(bytes, value);
+    out.append(bytes, sizeof(T));
+}}
+
+template<typename T>
+inline bool serial_read(std::string_view& in, T& value)
+{{
+    if (in.size() < sizeof(T))
+        return false;
+
+    serial_get(in.data(), value);
+    in.remove_prefix(sizeof(T));
+    return true;
+}}
+
+inline void serial_write_string(std::string& out, std::string const& s)
+{{
+    serial_write(out, std::uint64_t(s.size()));
+    out.append(s);
+}}
+
+inline bool serial_read_string(std::string_view& in, std::string& s)
+{{
+    std::uint64_t size;
+    if (!serial_read(in, size) || in.size() < size)
+        return false;
+
+    s.assign(in.data(), size);
+    in.remove_prefix(size);
+    return true;
+}}
+
+inline void serial_write_header(std::string& out, std::uint64_t layout_hash, std::uint64_t count)
+{{
+    serial_write(out, SerialMagic);
+    serial_write(out, SerialVersion);
+    serial_write(out, layout_hash);
+    serial_write(out, count);
+}}
+
+inline bool serial_read_header(std::string_view& in, std::uint64_t layout_hash, std::uint64_t& count)
+{{
+    std::uint32_t magic, version;
+    std::uint64_t hash;
+    return serial_read(in, magic) && magic == SerialMagic
+        && serial_read(in, version) && version == SerialVersion
+        && serial_read(in, hash) && hash == layout_hash
+        && serial_read(in, count);
+}}
+"""
+    ), shared=True)
+
+    tagged_structs = fa.collect_tagged_decls(tu.cursor, ["serialize"], ["struct_decl"])
+    for cls in tagged_structs:
+        emit_serialize_to_cb(cls)
+
+    return [cpp]
@@ -2,18 +2,31 @@ import fct
 
 
 # TOOL CONFIG
-# /
+
+SOA_ALIGNMENT = 64
+"""
+alignment in bytes of each column buffer of `SoaVec`, a cache line by default (also enough for avx-512 loads)
+"""
+
+EMIT_SOA_VEC = True
+"""
+if true, a growable `SoaVec<T>` is emitted next to the fixed capacity `Soa<T, Capacity>`.
+fields with note "soa_cold" are not given their own column, but are grouped in a single column of `SoaVec<T>::Cold`.
+it needs c++20 (`std::span`, `std::construct_at`), older standards only see `Soa<T, Capacity>`
+"""
 
 
 fa = fct.analysis
 CppPieceBuilder = fct.CppPieceBuilder
-cindex = fct.clang.cindex
-CursorKind = cindex.CursorKind
-TranslationUnit = cindex.TranslationUnit
+TranslationUnit = fa.ClangTranslationUnit
 ClangNode = fa.ClangNode
 
+# `SoaVec` needs c++20 library features, the projects on older standards don't see it
+SOA_VEC_GUARD = "#if __cplusplus >= 202002L"
 
-cpp = fct.CppBuilder("soa", ["<stddef.h>"])
+
+cpp = fct.CppBuilder("soa", ["<stddef.h>", "<cstddef>", "<new>", "<memory>", "<span>", "<utility>"])
+PRODUCES = [cpp.name]
 
 
 def gen_soa(fqn: str, cls: ClangNode) -> CppPieceBuilder:
@@ -84,16 +97,225 @@ f"""
     return pb
 
 
-def emit_enum_info_to_cb(cls: ClangNode) -> None:
+def gen_soa_vec(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    fields = fa.get_fields(cls)
+    hot = [f for f in fields if not fa.hastag(f, "soa_cold")]
+    cold = [f for f in fields if fa.hastag(f, "soa_cold")]
+
+    # (column type, column name) of every buffer
+    columns = [(f.type.spelling, f"col_{f.spelling}") for f in hot]
+    if len(cold) > 0:
+        columns.append(("Cold", "col_cold"))
+
+    pb = CppPieceBuilder()
+    pb.add_flat(
+f"""
+{SOA_VEC_GUARD}
+template<>
+struct SoaVec<{fqn}>
+{{
+    static constexpr size_t Alignment = {SOA_ALIGNMENT};
+"""
+    )
+
+    if len(cold) > 0:
+        pb.line()
+        pb.line("// rarely accessed fields, stored together in a single column")
+        pb.line("struct Cold")
+        pb.body()
+        for f in cold:
+            pb.line(f"{f.type.spelling} {f.spelling};")
+        pb.unindent()
+        pb.line("};")
+
+    pb.add_flat(
+"""
+    SoaVec() = default;
+
+    explicit SoaVec(size_t initial_capacity)
+    {
+        reserve(initial_capacity);
+    }
+
+    SoaVec(SoaVec const&) = delete;
+    SoaVec& operator=(SoaVec const&) = delete;
+
+    SoaVec(SoaVec&& other) noexcept
+    {
+        swap(other);
+    }
+
+    SoaVec& operator=(SoaVec&& other) noexcept
+    {
+        SoaVec(std::move(other)).swap(*this);
+        return *this;
+    }
+
+    ~SoaVec()
+    {
+        clear();
+"""
+    )
+    pb.indent()
+    for _, col in columns:
+        pb.line(f"soa_deallocate<Alignment>({col});")
+    pb.unbody()
+
+    pb.line()
+    pb.line("inline size_t size() const { return count; }")
+    pb.line("inline size_t capacity() const { return cap; }")
+    pb.line("inline bool empty() const { return count == 0; }")
+
+    pb.line()
+    pb.line("void swap(SoaVec& other) noexcept")
+    pb.body()
+    pb.line("std::swap(count, other.count);")
+    pb.line("std::swap(cap, other.cap);")
+    for _, col in columns:
+        pb.line(f"std::swap({col}, other.{col});")
+    pb.unbody()
+
+    pb.line()
+    pb.line("void reserve(size_t new_capacity)")
+    pb.body()
+    pb.line("if (new_capacity <= cap)")
+    pb.indent()
+    pb.line("return;")
+    pb.unindent()
+    pb.line()
+    pb.line("// a multiple of `Alignment` elements, the end of every column is aligned as well")
+    pb.line("new_capacity = (new_capacity + Alignment - 1) / Alignment * Alignment;")
+    for _, col in columns:
+        pb.line(f"{col} = soa_reallocate<Alignment>({col}, count, new_capacity);")
+    pb.line("cap = new_capacity;")
+    pb.unbody()
+
+    pb.line()
+    pb.line("void clear()")
+    pb.body()
+    for _, col in columns:
+        pb.line(f"std::destroy_n({col}, count);")
+    pb.line("count = 0;")
+    pb.unbody()
+
+    pb.line()
+    pb.line(f"void push_back({fqn} const& value)")
+    pb.body()
+    pb.line("if (count == cap)")
+    pb.indent()
+    pb.line("reserve(cap == 0 ? Alignment : cap * 2);")
+    pb.unindent()
+    pb.line()
+    for f in hot:
+        pb.line(f"std::construct_at(col_{f.spelling} + count, value.{f.spelling});")
+    if len(cold) > 0:
+        pb.line(f"std::construct_at(col_cold + count, Cold {{ {', '.join(f'value.{f.spelling}' for f in cold)} }});")
+    pb.line("count++;")
+    pb.unbody()
+
+    pb.line()
+    pb.line("// appends `n` structs, one column at a time")
+    pb.line(f"void copy_from_aos({fqn} const* in_buffer, size_t n)")
+    pb.body()
+    pb.line("reserve(count + n);")
+    for f in hot:
+        pb.line("for (size_t i = 0; i < n; i++)")
+        pb.indent()
+        pb.line(f"std::construct_at(col_{f.spelling} + count + i, in_buffer[i].{f.spelling});")
+        pb.unindent()
+    if len(cold) > 0:
+        pb.line("for (size_t i = 0; i < n; i++)")
+        pb.indent()
+        pb.line(f"std::construct_at(col_cold + count + i, Cold {{ {', '.join(f'in_buffer[i].{f.spelling}' for f in cold)} }});")
+        pb.unindent()
+    pb.line("count += n;")
+    pb.unbody()
+
+    pb.line()
+    pb.line("// `out_buffer` must hold `size()` structs, filled one column at a time")
+    pb.line(f"void copy_to_aos({fqn}* out_buffer) const")
+    pb.body()
+    for f in hot:
+        pb.line("for (size_t i = 0; i < count; i++)")
+        pb.indent()
+        pb.line(f"out_buffer[i].{f.spelling} = col_{f.spelling}[i];")
+        pb.unindent()
+    if len(cold) > 0:
+        pb.line("for (size_t i = 0; i < count; i++)")
+        pb.body()
+        for f in cold:
+            pb.line(f"out_buffer[i].{f.spelling} = col_cold[i].{f.spelling};")
+        pb.unbody()
+    pb.unbody()
+
+    pb.line()
+    pb.line(f"inline {fqn} get(size_t idx) const")
+    pb.body()
+    pb.line(f"{fqn} r;")
+    for f in hot:
+        pb.line(f"r.{f.spelling} = col_{f.spelling}[idx];")
+    for f in cold:
+        pb.line(f"r.{f.spelling} = col_cold[idx].{f.spelling};")
+    pb.line("return r;")
+    pb.unbody()
+
+    pb.line()
+    pb.line(f"inline void set(size_t idx, {fqn} const& value)")
+    pb.body()
+    for f in hot:
+        pb.line(f"col_{f.spelling}[idx] = value.{f.spelling};")
+    for f in cold:
+        pb.line(f"col_cold[idx].{f.spelling} = value.{f.spelling};")
+    pb.unbody()
+
+    for f in fields:
+        ftype = f.type.spelling
+        fname = f.spelling
+        felem = f"col_cold[idx].{fname}" if f in cold else f"col_{fname}[idx]"
+
+        pb.line()
+        pb.line(f"// field `{fqn}.{fname}`")
+        pb.line(f"inline {ftype} const& get_{fname}(size_t idx) const {{ return {felem}; }}")
+        pb.line(f"inline void set_{fname}(size_t idx, {ftype} value) {{ {felem} = std::move(value); }}")
+
+    # column views, the only way to reach the buffers, for vectorizable loops
+    for ctype, col in columns:
+        name = col.removeprefix("col_")
+        pb.line()
+        pb.line(f"inline std::span<{ctype}> column_{name}() {{ return {{ {col}, count }}; }}")
+        pb.line(f"inline std::span<{ctype} const> column_{name}() const {{ return {{ {col}, count }}; }}")
+
+    pb.line()
+    pb.unindent()
+    pb.line("private:")
+    pb.indent()
+    pb.line("size_t count = 0;")
+    pb.line("size_t cap = 0;")
+    for ctype, col in columns:
+        pb.line(f"{ctype}* {col} = nullptr;")
+
+    pb.unindent()
+    pb.line("};")
+    pb.line("#endif")
+
+    return pb
+
+
+def emit_soa_to_cb(cls: ClangNode) -> None:
     global cpp
 
     fqn = fa.get_fully_qualified_name(cls)
-    cpp.add(fqn, gen_soa(fqn, cls))
+    cpp.add(fqn, gen_soa(fqn, cls), origin=fa.origin_of(cls), group=fqn)
+
+    if EMIT_SOA_VEC:
+        cpp.add(f"{fqn} SoaVec", gen_soa_vec(fqn, cls), origin=fa.origin_of(cls), group=fqn)
 
 
 def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
     global cpp
 
+    cpp.clear()
+
     cpp.add("unbound_soa", fct.piece(
 """
 template<typename StructT, size_t capacity>
@@ -102,10 +324,44 @@ struct Soa
     
 };
 """
-    ))
+    ), shared=True)
+
+    if EMIT_SOA_VEC:
+        cpp.add("unbound_soa_vec", fct.piece(SOA_VEC_GUARD +
+"""
+template<typename StructT>
+struct SoaVec
+{
+
+};
+
+template<size_t Alignment, typename T>
+inline void soa_deallocate(T* buffer)
+{
+    if (buffer != nullptr)
+        ::operator delete(buffer, std::align_val_t(Alignment < alignof(T) ? alignof(T) : Alignment));
+}
+
+// moves the first `count` elements to a new buffer of `capacity` elements
+template<size_t Alignment, typename T>
+inline T* soa_reallocate(T* buffer, size_t count, size_t capacity)
+{
+    auto fresh = static_cast<T*>(::operator new(
+        capacity * sizeof(T),
+        std::align_val_t(Alignment < alignof(T) ? alignof(T) : Alignment)
+    ));
+
+    std::uninitialized_move_n(buffer, count, fresh);
+    std::destroy_n(buffer, count);
+    soa_deallocate<Alignment>(buffer);
+    return fresh;
+}
+#endif
+"""
+        ), shared=True)
 
-    tagged_enums = fa.collect_tagged_decls(tu.cursor, ["soa"], ["struct_decl"])
-    for en in tagged_enums:
-        emit_enum_info_to_cb(en)
+    tagged_structs = fa.collect_tagged_decls(tu.cursor, ["soa"], ["struct_decl"])
+    for cls in tagged_structs:
+        emit_soa_to_cb(cls)
 
     return [cpp]
@@ -0,0 +1,299 @@
+import fct
+
+
+# TOOL CONFIG
+
+EMIT_STD_HASH = True
+"""
+if true, `std::hash<T>` is specialized for every tagged struct, so it can directly be used as key
+of `std::unordered_map` and `std::unordered_set`, otherwise use `g::Hash<T>` and `g::Equal<T>`
+"""
+
+EMIT_OPERATOR_EQ = True
+"""
+if true, `operator==` is generated in the namespace of every tagged struct that doesn't declare one
+"""
+
+
+fa = fct.analysis
+CppPieceBuilder = fct.CppPieceBuilder
+TranslationUnit = fa.ClangTranslationUnit
+ClangNode = fa.ClangNode
+
+
+cpp = fct.CppBuilder("hash", ["<string_view>", "<functional>", "<type_traits>", "<cstring>", "<cstdint>", "<cstddef>", "<bit>"])
+PRODUCES = [cpp.name]
+
+
+def gen_hash_of(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline std::uint64_t hash_of({fqn} const& self)")
+
+    pb.line(f"if constexpr (std::has_unique_object_representations_v<{fqn}>)")
+    pb.body()
+    pb.line("// equal values have equal bytes, a single pass over them")
+    pb.line(f"return hash_bytes(&self, sizeof({fqn}));")
+    pb.unbody()
+    pb.line()
+
+    pb.line("std::uint64_t h = HashSeed;")
+    for f in fa.get_fields(cls):
+        emit_nested_to_cb(f)
+        pb.line(f"h = hash_step(h, hash_value(self.{f.spelling}));")
+
+    pb.line("return hash_finish(h);")
+
+    return pb
+
+
+def gen_equals(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    pb = CppPieceBuilder(f"inline bool equals({fqn} const& a, {fqn} const& b)")
+
+    pb.line(f"if constexpr (std::has_unique_object_representations_v<{fqn}>)")
+    pb.indent()
+    pb.line(f"return std::memcmp(&a, &b, sizeof({fqn})) == 0;")
+    pb.unindent()
+    pb.line()
+
+    fields = fa.get_fields(cls)
+    if len(fields) == 0:
+        pb.line("return true;")
+        return pb
+
+    pb.line("return")
+    pb.indent()
+    for i, f in enumerate(fields):
+        sep = ";" if i == len(fields) - 1 else " &&"
+        pb.line(f"equal_value(a.{f.spelling}, b.{f.spelling}){sep}")
+    pb.unindent()
+
+    return pb
+
+
+def declares_operator_eq(cls: ClangNode) -> bool:
+    return any(c.spelling == "operator==" for c in cls.get_children())
+
+
+def enclosing_namespaces(node: ClangNode) -> list[str]:
+    parts = []
+
+    node = node.semantic_parent
+    while node and fa.kindof(node) != "translation_unit":
+        if fa.kindof(node) == "namespace":
+            parts.append(node.spelling)
+
+        node = node.semantic_parent
+
+    return list(reversed(parts))
+
+
+def gen_std_specializations(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    """
+    `std::hash` must be specialized in the global scope, and `operator==` must be in the namespace
+    of the struct to be found by argument dependent lookup, so namespace `g` is closed and reopened around them
+    """
+
+    pb = CppPieceBuilder(initial_indent_level=0)
+    pb.line("}")
+
+    if EMIT_STD_HASH:
+        pb.add_flat(
+f"""
+template<>
+struct std::hash<{fqn}>
+{{
+    size_t operator()({fqn} const& self) const noexcept
+    {{
+        return size_t(g::hash_of(self));
+    }}
+}};
+""")
+
+    if EMIT_OPERATOR_EQ and not declares_operator_eq(cls):
+        pb.line()
+        namespaces = enclosing_namespaces(cls)
+        for ns in namespaces:
+            pb.line(f"namespace {ns}" if ns != "" else "namespace")
+            pb.line("{")
+
+        pb.line(f"inline bool operator==({fqn} const& a, {fqn} const& b) {{ return g::equals(a, b); }}")
+
+        for _ in namespaces:
+            pb.line("}")
+
+    pb.line()
+    pb.line("namespace g")
+    pb.line("{")
+
+    return pb
+
+
+project_scope: fa.ProjectScope
+
+
+def emit_nested_to_cb(f: ClangNode) -> None:
+    """
+    nested structs of the project get `hash_of` and `equals` too,
+    but `std::hash` and `operator==` only when they are tagged as well.
+    the others (`std::string` for example) are hashed with `std::hash`
+    """
+
+    global project_scope
+
+    t = f.type.get_canonical()
+    while fa.typekind(t) == "constantarray":
+        t = t.get_array_element_type().get_canonical()
+
+    if fa.typekind(t) != "record":
+        return
+
+    decl = t.get_declaration()
+    if fa.kindof(decl) in ["struct_decl", "class_decl"] and project_scope.contains(decl):
+        emit_hash_to_cb(decl, with_std_specializations=fa.hastag(decl, "hash"))
+        cpp.add_use(fa.get_fully_qualified_name(f.semantic_parent), fa.get_fully_qualified_name(decl))
+
+
+def emit_hash_to_cb(cls: ClangNode, with_std_specializations: bool) -> None:
+    global cpp
+
+    fqn = fa.get_fully_qualified_name(cls)
+    if cpp.has(fqn):
+        return
+
+    origin = fa.origin_of(cls)
+
+    # reserved first, nested structs are emitted while generating the fields
+    cpp.add(fqn, gen_hash_of(fqn, cls), origin=origin, group=fqn)
+    cpp.add(f"{fqn} equals", gen_equals(fqn, cls), origin=origin, group=fqn)
+
+    if with_std_specializations and (EMIT_STD_HASH or EMIT_OPERATOR_EQ):
+        cpp.add(f"{fqn} std", gen_std_specializations(fqn, cls), origin=origin, group=fqn)
+
+
+def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
+    global cpp
+
+    cpp.clear()
+
+    cpp.add("unbound_hash", fct.piece(
+"""
+constexpr std::uint64_t HashSeed = 0x2D358DCCAA6C78A5ULL;
+
+inline std::uint64_t hash_step(std::uint64_t h, std::uint64_t word)
+{
+    return std::rotl(h ^ word, 27) * 0x9E3779B97F4A7C15ULL;
+}
+
+// murmur3 finalizer, every bit of `h` affects every bit of the result
+inline std::uint64_t hash_finish(std::uint64_t h)
+{
+    h ^= h >> 33;
+    h *= 0xFF51AFD7ED558CCDULL;
+    h ^= h >> 33;
+    h *= 0xC4CEB9FE1A85EC53ULL;
+    h ^= h >> 33;
+    return h;
+}
+
+inline std::uint64_t hash_bytes(void const* data, size_t size)
+{
+    auto p = static_cast<unsigned char const*>(data);
+    std::uint64_t h = hash_step(HashSeed, size);
+
+    for (; size >= 8; p += 8, size -= 8)
+    {
+        std::uint64_t word;
+        std::memcpy(&word, p, 8);
+        h = hash_step(h, word);
+    }
+
+    if (size > 0)
+    {
+        std::uint64_t word = 0;
+        std::memcpy(&word, p, size);
+        h = hash_step(h, word);
+    }
+
+    return hash_finish(h);
+}
+
+// the word a field contributes to the hash of its struct
+template<typename T>
+inline std::uint64_t hash_value(T const& value)
+{
+    if constexpr (requires { hash_of(value); })
+        return hash_of(value);
+    else if constexpr (std::is_array_v<T>)
+    {
+        std::uint64_t h = HashSeed;
+        for (auto const& e : value)
+            h = hash_step(h, hash_value(e));
+
+        return hash_finish(h);
+    }
+    else if constexpr (std::is_same_v<T, float> || std::is_same_v<T, double>)
+    {
+        // +0.0 == -0.0, so they must hash the same
+        T v = value == T(0) ? T(0) : value;
+        std::uint64_t word = 0;
+        std::memcpy(&word, &v, sizeof(T));
+        return word;
+    }
+    else if constexpr (std::is_integral_v<T> || std::is_enum_v<T>)
+        return static_cast<std::uint64_t>(value);
+    else if constexpr (std::is_pointer_v<T>)
+        return reinterpret_cast<std::uintptr_t>(value);
+    else if constexpr (std::is_convertible_v<T const&, std::string_view>)
+    {
+        std::string_view s = value;
+        return hash_bytes(s.data(), s.size());
+    }
+    else
+        return std::hash<T>{}(value);
+}
+
+template<typename T>
+inline bool equal_value(T const& a, T const& b)
+{
+    if constexpr (requires { equals(a, b); })
+        return equals(a, b);
+    else if constexpr (std::is_array_v<T>)
+    {
+        for (size_t i = 0; i < std::extent_v<T>; i++)
+            if (!equal_value(a[i], b[i]))
+                return false;
+
+        return true;
+    }
+    else
+        return a == b;
+}
+
+// functors for hash containers, when `std::hash` and `operator==` are not wanted
+template<typename T>
+struct Hash
+{
+    size_t operator()(T const& self) const noexcept
+    {
+        return size_t(hash_of(self));
+    }
+};
+
+template<typename T>
+struct Equal
+{
+    bool operator()(T const& a, T const& b) const noexcept
+    {
+        return equals(a, b);
+    }
+};
+"""
+    ), shared=True)
+
+    global project_scope
+    project_scope = fa.ProjectScope(fct.bopt.project_dirs)
+
+    tagged_structs = fa.collect_tagged_decls(tu.cursor, ["hash"], ["struct_decl", "class_decl"])
+    for cls in tagged_structs:
+        emit_hash_to_cb(cls, with_std_specializations=True)
+
+    return [cpp]
@@ -9,16 +9,24 @@ if false, fields of type struct (but struct without "struct_repr" note)
 are represented as `struct_name(...)` instead of detailed repr (field-by-field)
 """
 
+EMIT_REPR_INTO = True
+"""
+if true, the repr of each struct is generated as `repr_into(std::string& out, self, indent)`,
+appending to a caller provided buffer without intermediate strings, numbers formatted with `std::to_chars`
+(floating points with 6 significant digits, as the stream would print them).
+`repr(self, indent)` is then a thin wrapper around it.
+if false, `repr` builds a `std::stringstream` per struct (and per nested struct field)
+"""
+
 
 fa = fct.analysis
 CppPieceBuilder = fct.CppPieceBuilder
-cindex = fct.clang.cindex
-CursorKind = cindex.CursorKind
-TranslationUnit = cindex.TranslationUnit
+TranslationUnit = fa.ClangTranslationUnit
 ClangNode = fa.ClangNode
 
 
-cpp = fct.CppBuilder("repr", ["<string>", "<sstream>"])
+cpp = fct.CppBuilder("repr", ["<string>", "<string_view>", "<sstream>", "<charconv>", "<cstdint>", "<type_traits>"])
+PRODUCES = [cpp.name]
 tagged_structs: list[ClangNode]
 
 
@@ -63,6 +71,7 @@ def emit_field_repr_to_pb(pb: CppPieceBuilder, f: ClangNode) -> None:
                     pb.add_flat(f'"{fa.get_fully_qualified_name(decl)}(...)"')
                 else:
                     emit_struct_repr_to_cb(decl)
+                    cpp.add_use(fa.get_fully_qualified_name(f.semantic_parent), fa.get_fully_qualified_name(decl))
                     pb.add_flat(f'repr({fvalue}, indent + 4)')
         
         case _:
@@ -75,8 +84,8 @@ def emit_field_repr_to_pb(pb: CppPieceBuilder, f: ClangNode) -> None:
 def gen_struct_repr(fqn: str, cls: ClangNode) -> CppPieceBuilder:
     needs_inline = fa.hastag(cls, "struct_repr_inline")
     pb = CppPieceBuilder(
-        f'std::string repr({fqn} const& self, size_t indent)',
-        head=f'std::string repr({fqn} const& self, size_t indent = 0)'
+        f'inline std::string repr({fqn} const& self, size_t indent)',
+        head=f'inline std::string repr({fqn} const& self, size_t indent = 0)'
     )
 
     if needs_inline:
@@ -107,6 +116,103 @@ def gen_struct_repr(fqn: str, cls: ClangNode) -> CppPieceBuilder:
     return pb
 
 
+def emit_field_repr_into_to_pb(pb: CppPieceBuilder, f: ClangNode) -> None:
+    global tagged_structs
+
+    fvalue = f"self.{f.spelling}"
+
+    alias_type = fa.get_fully_qualified_name(f.type.get_declaration())
+    t = f.type.get_canonical()
+    tk = fa.typekind(t)
+
+    match tk:
+        case "bool":
+            pb.line(f'out += {fvalue} ? "true" : "false";')
+
+        case "uchar" | "schar" | "char_s" | "char_u":
+            match alias_type:
+                case "int8_t":
+                    pb.line(f"repr_value_into(out, int({fvalue}));")
+                case "uint8_t":
+                    pb.line(f"repr_value_into(out, uint({fvalue}));")
+                case _:
+                    pb.line("out += '\\'';")
+                    pb.line(f"normalize_char_into(out, {fvalue});")
+                    pb.line("out += '\\'';")
+
+        case "pointer":
+            # c string
+            if fa.typekind(t.get_pointee()) in ["char_s", "char_u"]:
+                pb.line(f"repr_s_into(out, {fvalue});")
+            else:
+                # generic pointer
+                pb.line(f"repr_value_into(out, (void const*){fvalue});")
+
+        case "record":
+            if alias_type == "std::string" and t.spelling == "std::basic_string<char>":
+                pb.line('out += "std::string(";')
+                pb.line(f"repr_s_into(out, {fvalue});")
+                pb.line("out += ')';")
+            else:
+                decl = t.get_declaration()
+                if decl not in tagged_structs and SKIP_FIELDS_OF_UNREGISTERED_STRUCT_TYPES:
+                    pb.line(f'out += "{fa.get_fully_qualified_name(decl)}(...)";')
+                else:
+                    emit_struct_repr_to_cb(decl)
+                    cpp.add_use(fa.get_fully_qualified_name(f.semantic_parent), fa.get_fully_qualified_name(decl))
+                    pb.line(f"repr_into(out, {fvalue}, indent + 4);")
+
+        case _:
+            pb.line(f"repr_value_into(out, {fvalue});")
+
+
+def gen_struct_repr_into(fqn: str, cls: ClangNode) -> CppPieceBuilder:
+    needs_inline = fa.hastag(cls, "struct_repr_inline")
+    pb = CppPieceBuilder(
+        f"inline void repr_into(std::string& out, {fqn} const& self, size_t indent)",
+        head=f"inline void repr_into(std::string& out, {fqn} const& self, size_t indent = 0)"
+    )
+
+    # the separators are known here, so they are folded into the literals
+    if needs_inline:
+        # printed on a single line, whatever the indentation
+        pb.line("(void)indent;")
+        pb.line(f'out += "{fqn} {{ ";')
+    else:
+        pb.line(f'out += "{fqn}\\n";')
+        pb.line("out.append(indent, ' ');")
+        pb.line('out += "{\\n";')
+
+    for f in fa.get_fields(cls):
+        pb.line()
+        if not needs_inline:
+            pb.line("out.append(indent + 4, ' ');")
+
+        pb.line(f'out += ".{f.spelling} = ";')
+        emit_field_repr_into_to_pb(pb, f)
+        pb.line('out += ", ";' if needs_inline else 'out += ",\\n";')
+
+    pb.line()
+    if not needs_inline:
+        pb.line("out.append(indent, ' ');")
+
+    pb.line("out += '}';")
+
+    return pb
+
+
+def gen_struct_repr_wrapper(fqn: str) -> CppPieceBuilder:
+    pb = CppPieceBuilder(
+        f"inline std::string repr({fqn} const& self, size_t indent)",
+        head=f"inline std::string repr({fqn} const& self, size_t indent = 0)"
+    )
+    pb.line("std::string out;")
+    pb.line("repr_into(out, self, indent);")
+    pb.line("return out;")
+
+    return pb
+
+
 def emit_struct_repr_to_cb(cls: ClangNode) -> None:
     global cpp
 
@@ -114,16 +220,24 @@ def emit_struct_repr_to_cb(cls: ClangNode) -> None:
     if cpp.has(fqn):
         return
 
-    cpp.add(fqn, gen_struct_repr(fqn, cls))
+    if not EMIT_REPR_INTO:
+        cpp.add(fqn, gen_struct_repr(fqn, cls), origin=fa.origin_of(cls), group=fqn)
+        return
+
+    # reserved first, nested structs are emitted while generating the fields
+    cpp.add(fqn, gen_struct_repr_wrapper(fqn), origin=fa.origin_of(cls), group=fqn)
+    cpp.add(f"{fqn} repr_into", gen_struct_repr_into(fqn, cls), origin=fa.origin_of(cls), group=fqn)
 
 
 def execute(tu: TranslationUnit) -> list[fct.CppBuilder]:
     global cpp
 
+    cpp.clear()
+
     repr_s = CppPieceBuilder()
     repr_s.add_flat(
 r"""
-void normalize_char(std::stringstream& ss, char c)
+inline void normalize_char(std::stringstream& ss, char c)
 {
     switch (c) {
         case '"':  ss << "\\\""; break;
@@ -136,7 +250,7 @@ void normalize_char(std::stringstream& ss, char c)
     }
 }
 
-std::string repr_s(std::string const& s)
+inline std::string repr_s(std::string const& s)
 {
     std::stringstream ss;
     ss << "\"";
@@ -147,13 +261,82 @@ std::string repr_s(std::string const& s)
     return ss.str();
 }
 """)
-    cpp.add("std::string and char repr", repr_s)
+    cpp.add("std::string and char repr", repr_s, shared=True)
 
-    # static precomputed indent
-    cpp.add(
-        "PRECOMPUTED_INDENT",
-        CppPieceBuilder(f'static char const PRECOMPUTED_INDENT[] = "{" " * (2**8 - 1)}"', is_def=False)
-    )
+    if EMIT_REPR_INTO:
+        repr_into = CppPieceBuilder()
+        repr_into.add_flat(
+r"""
+inline void normalize_char_into(std::string& out, char c)
+{
+    switch (c) {
+        case '"':  out += "\\\""; break;
+        case '\\': out += "\\\\"; break;
+        case '\n': out += "\\n";  break;
+        case '\t': out += "\\t";  break;
+        case '\r': out += "\\r";  break;
+        case '\0': out += "\\0";  break;
+        default:   out += c;      break;
+    }
+}
+
+inline void repr_s_into(std::string& out, std::string_view s)
+{
+    out += '"';
+    for (char c : s)
+        normalize_char_into(out, c);
+
+    out += '"';
+}
+
+template<typename T>
+inline void repr_value_into(std::string& out, T const& value)
+{
+    if constexpr (std::is_same_v<T, bool>)
+    {
+        out += value ? "true" : "false";
+    }
+    else if constexpr (std::is_enum_v<T>)
+    {
+        repr_value_into(out, static_cast<std::underlying_type_t<T>>(value));
+    }
+    else if constexpr (std::is_floating_point_v<T>)
+    {
+        // same digits a stream prints by default, rather than the shortest round trip form
+        char buf[64];
+        auto res = std::to_chars(buf, buf + sizeof(buf), value, std::chars_format::general, 6);
+        out.append(buf, res.ptr);
+    }
+    else if constexpr (std::is_integral_v<T>)
+    {
+        char buf[64];
+        auto res = std::to_chars(buf, buf + sizeof(buf), value);
+        out.append(buf, res.ptr);
+    }
+    else if constexpr (std::is_pointer_v<T>)
+    {
+        char buf[2 * sizeof(std::uintptr_t)];
+        auto res = std::to_chars(buf, buf + sizeof(buf), reinterpret_cast<std::uintptr_t>(value), 16);
+        out += "0x";
+        out.append(buf, res.ptr);
+    }
+    else
+    {
+        // no `std::to_chars` for this type, fallback to its stream operator
+        std::stringstream ss;
+        ss << value;
+        out += ss.str();
+    }
+}
+""")
+        cpp.add("repr_into helpers", repr_into, shared=True)
+    else:
+        # static precomputed indent
+        cpp.add(
+            "PRECOMPUTED_INDENT",
+            CppPieceBuilder(f'static char const PRECOMPUTED_INDENT[] = "{" " * (2**8 - 1)}"', is_def=False),
+            shared=True
+        )
 
     global tagged_structs
     tagged_structs = fa.collect_tagged_decls(tu.cursor, ["struct_repr", "struct_repr_inline"], ["struct_decl"])